@@ -0,0 +1,84 @@
+from cola.fundamental.base_lm import BaseLM
+from cola.tools.lm_cache.DiskResponseCache import DiskResponseCache
+from cola.utils.error_utils import LMCacheMissError
+from pydantic import BaseModel
+from typing import List, Dict, Type, Optional, Any
+import asyncio
+import hashlib
+import json
+
+
+class CachedLM(BaseLM):
+    """Put a response cache in front of another LM.
+
+    Parameter:
+        lm: BaseLM, The LM that actually answers the requests
+        cache: DiskResponseCache, Store of the recorded responses
+        mode: str, "record" answers from the cache and records every miss,
+            "replay" only answers from the cache and raises LMCacheMissError on a miss,
+            "write" never answers from the cache and records every response, e.g. for a later replay
+    """
+
+    def __init__(self, lm: BaseLM, cache: DiskResponseCache, mode: str = "record"):
+        assert mode in ["record", "replay", "write"], \
+            f"Unknown cache mode: {mode}, expected 'record', 'replay' or 'write'."
+        self.lm = lm
+        self.cache = cache
+        self.mode = mode
+
+    def __getattr__(self, item):
+        # Expose the helpers of the wrapped LM, e.g. ChatGPT.create_message
+        if item == "lm":
+            raise AttributeError(item)
+        return getattr(self.lm, item)
+
+    def cache_key(self, messages: List[Dict], response_format: Optional[Type[BaseModel]] = None, **kwargs) -> str:
+        content = {
+            "model": getattr(self.lm, "model", self.lm.__class__.__name__),
+            "params": getattr(self.lm, "params", {}),
+            "messages": messages,
+            "response_format": None if response_format is None else response_format.model_json_schema(),
+            "kwargs": kwargs,
+        }
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _encode(response: Any) -> Dict:
+        if isinstance(response, BaseModel):
+            return {"parsed": response.model_dump(mode="json")}
+        return {"content": response}
+
+    @staticmethod
+    def _decode(record: Dict, response_format: Optional[Type[BaseModel]] = None) -> Any:
+        if "parsed" in record:
+            if response_format is None:
+                # The caller wants the raw text of the structured response
+                return json.dumps(record["parsed"], ensure_ascii=False)
+            return response_format.model_validate(record["parsed"])
+        return record["content"]
+
+    def query(self, messages: List[Dict[str, str]], response_format=None, **kwargs):
+        key = self.cache_key(messages, response_format, **kwargs)
+        record = None if self.mode == "write" else self.cache.get(key)
+        if record is not None:
+            return self._decode(record, response_format)
+        if self.mode == "replay":
+            raise LMCacheMissError(f"No cached response for request {key} in replay mode.")
+
+        response = self.lm.query(messages, response_format=response_format, **kwargs)
+        self.cache.set(key, self._encode(response))
+        return response
+
+    async def aquery(self, messages: List[Dict[str, str]], response_format=None, **kwargs):
+        key = self.cache_key(messages, response_format, **kwargs)
+        # The cache reads and writes files, they run in a thread so that the event loop is not blocked
+        record = None if self.mode == "write" else await asyncio.to_thread(self.cache.get, key)
+        if record is not None:
+            return self._decode(record, response_format)
+        if self.mode == "replay":
+            raise LMCacheMissError(f"No cached response for request {key} in replay mode.")
+
+        response = await self.lm.aquery(messages, response_format=response_format, **kwargs)
+        await asyncio.to_thread(self.cache.set, key, self._encode(response))
+        return response
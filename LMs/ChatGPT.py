@@ -1,20 +1,49 @@
 from cola.fundamental.base_lm import BaseLM
-from openai import OpenAI
 from PIL import Image
 from cola.utils.image_utils import encode_pil_image_to_base64
+from cola.utils.client_utils import get_openai_client, get_async_openai_client
 from functools import partial
 from typing import List, Dict
+import threading
 
 
 class ChatGPT(BaseLM):
     def __init__(self, openai_api_key: str, openai_api_base: str,
                  model: str = "gpt-4o-2024-08-06", **kwargs):
-        self.client = OpenAI(api_key=openai_api_key, base_url=openai_api_base)
+        self.model = model
+        self.params = kwargs
+        self.client = get_openai_client(openai_api_key, openai_api_base)
+        self.async_client = get_async_openai_client(openai_api_key, openai_api_base)
 
         self.format_chat = partial(
             self.client.beta.chat.completions.parse, model=model, **kwargs)
         self.normal_chat = partial(
             self.client.chat.completions.create, model=model, **kwargs)
+        self.async_format_chat = partial(
+            self.async_client.beta.chat.completions.parse, model=model, **kwargs)
+        self.async_normal_chat = partial(
+            self.async_client.chat.completions.create, model=model, **kwargs)
+
+        # Token usage reported by the api, cached_tokens are the prompt tokens served from the provider's prompt cache
+        self.usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def _record_usage(self, completion) -> None:
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        with self._usage_lock:
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            self.usage["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+            self.usage["cached_tokens"] += getattr(details, "cached_tokens", 0) or 0
+
+    def cached_token_ratio(self) -> float:
+        """Share of the prompt tokens that were served from the provider's prompt cache."""
+        if self.usage["prompt_tokens"] == 0:
+            return 0.0
+        return self.usage["cached_tokens"] / self.usage["prompt_tokens"]
 
     @staticmethod
     def create_message(text: str, image: Image.Image = None, role: str = "user"):
@@ -32,13 +61,27 @@ class ChatGPT(BaseLM):
         message = {"role": role, "content": content}
         return message
 
+    @staticmethod
+    def _parse_completion(completion, response_format=None):
+        if response_format is None:
+            return completion.choices[0].message.content
+        msg = completion.choices[0].message
+        if msg.refusal:
+            raise ValueError(f"OpenAI refused the request: {msg.refusal}")
+        return msg.parsed
+
     def query(self, messages: List[Dict[str, str]], response_format=None, **kwargs):
         if response_format is None:
             completion = self.normal_chat(messages=messages, **kwargs)
-            return completion.choices[0].message.content
         else:
             completion = self.format_chat(messages=messages, response_format=response_format, **kwargs)
-            msg = completion.choices[0].message
-            if msg.refusal:
-                raise ValueError(f"OpenAI refused the request: {msg.refusal}")
-            return msg.parsed
+        self._record_usage(completion)
+        return self._parse_completion(completion, response_format)
+
+    async def aquery(self, messages: List[Dict[str, str]], response_format=None, **kwargs):
+        if response_format is None:
+            completion = await self.async_normal_chat(messages=messages, **kwargs)
+        else:
+            completion = await self.async_format_chat(messages=messages, response_format=response_format, **kwargs)
+        self._record_usage(completion)
+        return self._parse_completion(completion, response_format)
@@ -1,4 +1,5 @@
 from .ChatGPT import ChatGPT
+from .CachedLM import CachedLM
 
 
 def create_lm_model(name, **kwargs):
@@ -2,13 +2,7 @@ from cola.fundamental import BaseRole
 from cola.utils.datatype import RoleType, WorkflowEvent
 from cola.utils.agent_utils import RegisterAgent
 from cola.utils.data_utils import PrivateData
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from cola.tools.op import verify_op_params, role_op
-from cola.tools.controller.screenshot import Photographer
-import time
-
-wai = WindowsApplicationInspector()
-capturer = Photographer()
 
 
 @RegisterAgent(ignore_capability=True)
@@ -48,9 +42,12 @@ class Executor(BaseRole):
         try:
             # All ops use the json schema format for parameter validation, so there is no need to manually validate the parameters here
             # verify_op_params(function, role, operations=None, ignore_params=None, **params)
+            capturer = self.session.capturer
             track_before_state = None if not track else capturer.take_desktop_screenshot()
             result = role_op[role][function](target_window, target_control, **params)
-            time.sleep(5)  # Pause to ensure that the effect of the action is executed
+            if target_window is not None or track:
+                # Wait until the effect of the action is visible, ops that do not touch the gui return at once
+                self.session.settler.wait(target_window)
             track_after_state = None if not track else capturer.take_desktop_screenshot()
 
             self.cdc.role_context.result = result
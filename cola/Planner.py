@@ -105,14 +105,10 @@ class Planner(BaseRole):
             self.cdc.session_context.task = data.task
 
         if not handoff:
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(PlannerResponseFormat),
-                *self.retrieve_long_term_memory(self.generate_summary())
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_make_sub_task_user_prompt(data)
-            ]
+                lambda: self.prompter.create_make_sub_task_user_prompt(data),
+            )
             origin_response, response = self.query(format_model=PlannerResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
                 return None
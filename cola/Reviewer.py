@@ -4,11 +4,8 @@ from cola.utils.datatype import WorkflowEvent, RoleType
 from cola.prompt.reviewer_prompt import ReviewerPrompt
 from cola.utils.data_utils import PrivateData
 from cola.utils.agent_utils import RegisterAgent
-from cola.tools.controller.screenshot import Photographer
 from pydantic import BaseModel, Field
 
-capturer = Photographer()
-
 _rf_params = dict(
     role=RoleType.Reviewer,
     additional_branch_type=None,
@@ -79,14 +76,10 @@ class Reviewer(BaseRole):
             self._track_execute_op = data.execute_op
             self._track_intend = data.intend
 
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(ReviewerResponseFormat),
-                *self.retrieve_long_term_memory(self.generate_summary()),
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_track_state_user_prompt(data)
-            ]
+                lambda: self.prompter.create_track_state_user_prompt(data),
+            )
 
             origin_response, response = self.query(format_model=ReviewerResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
@@ -5,6 +5,9 @@ from typing import Any, Callable, List, Optional, Dict
 from cola.utils.agent_utils import RegisterAgent
 from cola.utils.data_utils import PrivateData
 from pydantic import BaseModel, Field
+from config.config import Config
+
+config = Config.get_instance()
 
 _rf_params = dict(
     role=RoleType.TaskScheduler,
@@ -24,6 +27,11 @@ class DistributionFormat(BaseModel):
         ...,
         description="A list of subtasks that the specified role needs to process"
     )
+    depends_on: List[int] = Field(
+        default_factory=list,
+        description="The indexes (starting from 0) of the earlier entries of the distribution whose results this entry needs."
+                    " Use an empty list if the entry can be processed without them."
+    )
 
 
 class TaskSchedulerResponseFormat(BaseResponseFormat(**_rf_params)):
@@ -51,23 +59,79 @@ class TaskScheduler(BaseRole):
         self.cdc.create_base_role_context_space(self.role)
         self.cdc.base_role_context[self.role].distribution = []
         self.cdc.base_role_context[self.role].distribution_id = 0
+        self.cdc.base_role_context[self.role].dispatched = []  # indexes of the entries running in parallel
+
+    @staticmethod
+    def _is_parallel(entry: Dict) -> bool:
+        # The listed roles do not use the desktop, their entries can run next to the GUI roles
+        settings = config["parallel_dispatch"]
+        return bool(settings and settings["enable"]) and entry["role"] in settings["roles"]
+
+    @staticmethod
+    def _depends_on(distribution: List[Dict], index: int) -> List[int]:
+        # Only earlier entries count, so that the dependencies never form a cycle
+        return [i for i in distribution[index].get("depends_on") or [] if 0 <= i < index]
+
+    def _role_step_data(self, index: int) -> PrivateData:
+        context = self.cdc.base_role_context[self.role]
+        distribute_information = context.distribution[index]
+        link_message = {
+            "Performed action": "distribute a subtasks",
+            "Distribute information": distribute_information
+        }
+        self.store_short_term_memory(link_message)
+
+        data = PrivateData(
+            sender=self.role, receiver=distribute_information["role"],
+            event=WorkflowEvent.Role_step,
+            role_tasks=distribute_information["role_tasks"],
+            distribution_index=index
+        )
+        # The workflow waits for the entries running in parallel before starting this one
+        wait_for = [i for i in self._depends_on(context.distribution, index) if i in context.dispatched]
+        if wait_for:
+            data.wait_for = wait_for
+        return data
+
+    def _dispatch_parallel(self) -> List[PrivateData]:
+        """Mark the parallel entries whose dependencies are met as dispatched, and skip them."""
+        context = self.cdc.base_role_context[self.role]
+        distribution, dispatched = context.distribution, context.dispatched
+        while context.distribution_id < len(distribution) and context.distribution_id in dispatched:
+            context.distribution_id += 1
+
+        branches = []
+        for index in range(context.distribution_id, len(distribution)):
+            if index in dispatched or not self._is_parallel(distribution[index]):
+                continue
+            # An entry may wait for other parallel entries, but not for a GUI entry that has not finished yet
+            if all(i < context.distribution_id or self._is_parallel(distribution[i])
+                   for i in self._depends_on(distribution, index)):
+                branches.append(self._role_step_data(index))
+                dispatched.append(index)
+
+        while context.distribution_id < len(distribution) and context.distribution_id in dispatched:
+            context.distribution_id += 1
+        return branches
 
     def branch_step(self, response: Dict, data: Optional[PrivateData] = None, **kwargs) -> PrivateData:
         if (branch := response["branch"]) == "Continue":
-            distribute_information = self.cdc.base_role_context[self.role].distribution[
-                self.cdc.base_role_context[self.role].distribution_id]
-            link_message = {
-                "Performed action": "distribute a subtasks",
-                "Distribute information": distribute_information
-            }
-            self.store_short_term_memory(link_message)
-
-            self.cdc.role_context.role_tasks = distribute_information["role_tasks"]
-            return PrivateData(
-                sender=self.role, receiver=distribute_information["role"],
-                event=WorkflowEvent.Role_step,
-                role_tasks=distribute_information["role_tasks"]
-            )
+            context = self.cdc.base_role_context[self.role]
+            branches = self._dispatch_parallel()
+            if context.distribution_id >= len(context.distribution):
+                # No GUI entry is left, the workflow waits for the parallel entries before the Planner gets the results
+                next_data = PrivateData(
+                    sender=self.role, receiver=RoleType.Planner,
+                    event=WorkflowEvent.task_accomplished,
+                    role_infos=self.cdc.role_context["role_infos"]
+                )
+            else:
+                next_data = self._role_step_data(context.distribution_id)
+                self.cdc.role_context.role_tasks = next_data.role_tasks
+                self.cdc.set_distribution_index(context.distribution_id)
+            if branches:
+                next_data.parallel_branches = branches
+            return next_data
         elif branch == "RemakeSubtasks":
             return PrivateData(
                 sender=self.role, receiver=RoleType.Planner,
@@ -90,14 +154,10 @@ class TaskScheduler(BaseRole):
             if "sub_tasks" in data:
                 self.cdc.summary_context[self.role].sub_tasks = data.sub_tasks
 
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(TaskSchedulerResponseFormat),
-                *self.retrieve_long_term_memory(self.generate_summary())
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_distribute_subtasks_user_prompt(data)
-            ]
+                lambda: self.prompter.create_distribute_subtasks_user_prompt(data),
+            )
             origin_response, response = self.query(format_model=TaskSchedulerResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
                 return None
@@ -111,6 +171,8 @@ class TaskScheduler(BaseRole):
 
         self.cdc.base_role_context[self.role].distribution = response["distribution"]
         self.cdc.base_role_context[self.role].distribution_id = 0
+        self.cdc.base_role_context[self.role].dispatched = []
+        self.cdc.start_distribution()
 
         self.store_short_term_memory({
             "Generated distribution": response["distribution"],
@@ -125,11 +187,4 @@ class TaskScheduler(BaseRole):
         excepted keys:
         """
         self.cdc.base_role_context[self.role].distribution_id += 1
-        if self.cdc.base_role_context[self.role].distribution_id >= len(
-                self.cdc.base_role_context[self.role].distribution):
-            return PrivateData(
-                sender=self.role, receiver=RoleType.Planner,
-                event=WorkflowEvent.task_accomplished,
-                role_infos=self.cdc.role_context["role_infos"]
-            )
         return self.branch_step(dict(branch="Continue"), data=data)
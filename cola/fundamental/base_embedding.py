@@ -8,6 +8,10 @@ class BaseEmbedding(ABC):
         """Embed query text."""
         pass
 
+    def embed_documents(self, texts: List[Union[str, Any]]) -> List[List[float]]:
+        """Embed a list of texts."""
+        return [self.embed_query(text) for text in texts]
+
     @abstractmethod
     def get_embedding_dim(self) -> int:
         pass
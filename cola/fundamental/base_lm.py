@@ -1,8 +1,13 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict
+import asyncio
 
 
 class BaseLM(ABC):
     @abstractmethod
     def query(self, messages: List[Dict[str, str]], **kwargs):
         pass
+
+    async def aquery(self, messages: List[Dict[str, str]], **kwargs):
+        # Fall back to running the blocking query in a worker thread so that the event loop is not blocked
+        return await asyncio.to_thread(self.query, messages, **kwargs)
@@ -3,6 +3,9 @@ from typing import Any, List, Optional, Tuple, Union
 
 
 class BaseMemory(ABC):
+    # Bumped by every change of the content, so that the results derived from the memory can be cached
+    version: int = 0
+
     @abstractmethod
     def add(self, **kwargs):
         pass
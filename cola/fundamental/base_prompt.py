@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Union, Optional, Type
+from typing import Dict, List, Union, Optional, Type, Tuple, Callable
 from pathlib import Path
+from functools import wraps, lru_cache
+import threading
 from PIL import Image
 from cola.utils.image_utils import encode_pil_image_to_base64
 from pydantic import BaseModel
@@ -8,9 +10,68 @@ from cola.utils.print_utils import format_pydantic_model, any_to_str
 import yaml
 from cola.utils.data_utils import PrivateData
 from cola.utils.prompt_utils import catches
+from cola.utils.cache_utils import get_prompt_cache_version, bump_prompt_cache_version
+from cola.session import Session, get_session
+
+# path: (mtime, template), templates are read again only when they change on disk
+_template_cache: Dict[Path, Tuple[int, str]] = {}
+# Templates read by the system prompt being rendered in this thread, as (path, mtime)
+_rendering = threading.local()
+
+
+def clear_prompt_cache() -> None:
+    """Invalidate the cached templates and system prompts, e.g. when the operations change."""
+    _template_cache.clear()
+    bump_prompt_cache_version()
+
+
+def cache_system_prompt(func: Callable) -> Callable:
+    """Memoize a prompter method that renders a system prompt from its arguments.
+
+    The prompt is rendered again when clear_prompt_cache() is called or when one of the templates
+    it was rendered from changes on disk. Calls with unhashable arguments are not cached.
+    """
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs) -> Dict[str, str]:
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return func(self, *args, **kwargs)
+
+        cache = self.__dict__.setdefault("_system_prompt_cache", {})
+        cached = cache.get(key)
+        if cached is not None:
+            version, templates, prompt = cached
+            if version == get_prompt_cache_version() and all(
+                    path.stat().st_mtime_ns == mtime for path, mtime in templates):
+                return dict(prompt)
+
+        outer = getattr(_rendering, "templates", None)
+        _rendering.templates = []
+        try:
+            prompt = func(self, *args, **kwargs)
+            templates = _rendering.templates
+        finally:
+            _rendering.templates = outer
+        cache[key] = (get_prompt_cache_version(), templates, prompt)
+        return dict(prompt)
+
+    return wrapper
+
+
+@lru_cache(maxsize=None)
+def _format_description(format_model: Optional[Type[BaseModel]], indent: int) -> str:
+    return format_pydantic_model(format_model=format_model, indent=indent, return_str=True)
 
 
 class BasePrompt(ABC):
+    @property
+    def session(self) -> Session:
+        """The session of the role being prompted, BaseRole.step runs in it."""
+        return get_session()
+
     @staticmethod
     def create_role_prompt(role: str, contents: Union[List[Union[str, Image]], str], **kwargs) -> Dict:
         if isinstance(contents, str):
@@ -47,8 +108,16 @@ class BasePrompt(ABC):
         path = Path(path)
         if not path.is_file():
             raise FileNotFoundError(f"Prompt template not found at {path}")
+        mtime = path.stat().st_mtime_ns
+        if getattr(_rendering, "templates", None) is not None:
+            _rendering.templates.append((path, mtime))
+
+        cached = _template_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
         with path.open("r", encoding="utf-8") as f:
             template = f.read()
+        _template_cache[path] = (mtime, template)
         return template
 
     @staticmethod
@@ -60,6 +129,9 @@ class BasePrompt(ABC):
     @staticmethod
     def format_description(format_model: Optional[Type[BaseModel]] = None,
                            indent: int = 4, return_str: bool = True) -> Union[str, Dict]:
+        if return_str:
+            # The description of a model never changes within a process
+            return _format_description(format_model, indent)
         return format_pydantic_model(format_model=format_model, indent=indent, return_str=return_str)
 
     @staticmethod
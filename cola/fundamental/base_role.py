@@ -3,31 +3,51 @@ from cola.utils.json_utils import extract_json_from_response
 from cola.utils.print_utils import any_to_str, print_with_color
 from cola.utils.data_utils import PrivateData, ContextualDataCenter
 from cola.utils.error_utils import LMResponseFormatError, MaxQueryTimesError, MaxRetryTimesError
+from cola.utils.token_utils import count_tokens
+from cola.utils.context_utils import fit_texts, fit_context, report_dropped
 from cola.fundamental.base_lm import BaseLM
 from cola.fundamental.singleton import Singleton
 from cola.fundamental.base_memory import BaseMemory
 from cola.fundamental.base_prompt import BasePrompt
+from cola.session import Session, get_session, use_session
 from typing import Dict, Optional, List, Type, Tuple, Union, Callable, Any
+import contextvars
+import copy
 import os
 import json
+import asyncio
+import threading
 from abc import ABC
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import OrderedDict
 from pydantic import ValidationError, BaseModel
 from config.config import Config
-from logger.logger import ChatMessageLogger
 
-cm_logger = ChatMessageLogger()
 config = Config.get_instance()
+# Memory retrieval waits on the embedding service, it runs here while the roles inspect the UI
+_memory_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="memory-prefetch")
+# Roles running in parallel ask for human feedback one at a time
+_console_lock = threading.Lock()
 
 
 class MemoryMechanism:
     lt_memory_store: Optional[BaseMemory] = None  # long-term memory store
     st_memory_store: Optional[BaseMemory] = None  # short-term memory store
     n_chat_message_history: int = 2  # number of long-term memory history
+    lt_memory_score_threshold: Optional[float] = None  # long-term memories beyond the threshold are dropped
+    lt_memory_max_tokens: Optional[int] = None  # token budget of the long-term memory examples
+    st_memory_max_tokens: Optional[int] = None  # token budget of the short-term memory records
     n_short_message_history: int = 5  # number of short-term memory history
     session_step: Dict[str, List] = None  # record the whole session
+    _branch_records: Optional[List] = None  # short-term memory stored by a fork of the role, see BaseRole.fork
 
     def __init__(self, **kwargs):
-        pass
+        # (desc, store, store version, retrieval settings): messages, the latest retrievals of the role
+        self._lt_memory_cache: OrderedDict = OrderedDict()
+
+    def _token_model(self) -> Optional[str]:
+        # The tokenizer follows the model of the brain when it is known
+        return getattr(getattr(self, "brain", None), "model", None)
 
     def record_session_step(self, step: Dict = None, exp: str = None, **kwargs):
         """Records the session execution steps for subsequent retrieval.
@@ -53,30 +73,51 @@ class MemoryMechanism:
             If the history message is empty, the empty list is returned
         """
 
-        def _get_content(_his: List):
+        def _get_content(_his: List, _indent: Optional[int] = 4):
             _task_content = "Task: " + _his[0]["Task"]
             _step_content = []
             for _i, _s in enumerate(_his[1:]):
-                _step_content.append(f"(step {_i + 1})\n" + "```json\n" + json.dumps(_s, indent=4) + "\n```")
+                _step_content.append(f"(step {_i + 1})\n" + "```json\n" + json.dumps(_s, indent=_indent) + "\n```")
             _step_content = "Execution Steps:\n" + "\n".join(_step_content)
             return _task_content + "\n" + _step_content
 
         desc = any_to_str(desc)
 
         messages: List[Dict[str, str]] = []
-        # Retrieve history from database
-        if self.lt_memory_store is not None:
-            history: List[List] = self.lt_memory_store.similarity_search(
-                text=desc, k=self.n_chat_message_history)
-            # Reverse the history operations so that the history operation with the highest similarity is the last
-            history = history[::-1]
-
-            content = []
-            for i, h in enumerate(history):
-                content.append(f"[Example {i + 1}]\n" + _get_content(h))
-            content = "\n".join(content)
-            messages = [{"role": "system", "content": content}]
+        if self.lt_memory_store is None:
+            return messages
 
+        # The description rarely changes within a subtask, reuse the retrieval until the store changes
+        cache_key = (desc, id(self.lt_memory_store), self.lt_memory_store.version, self.n_chat_message_history,
+                     self.lt_memory_score_threshold, self.lt_memory_max_tokens)
+        if cache_key in self._lt_memory_cache:
+            self._lt_memory_cache.move_to_end(cache_key)
+            return [dict(m) for m in self._lt_memory_cache[cache_key]]
+
+        # Retrieve history from database
+        history: List[List] = self.lt_memory_store.similarity_search(
+            text=desc, k=self.n_chat_message_history, score_threshold=self.lt_memory_score_threshold)
+        # Reverse the history operations so that the history operation with the highest similarity is the last
+        history = history[::-1]
+
+        model = self._token_model()
+        examples = [_get_content(h) for h in history]
+        if self.lt_memory_max_tokens is not None and (
+                sum(count_tokens(e, model) for e in examples) > self.lt_memory_max_tokens):
+            # Compact the json of the steps before dropping the least similar examples
+            examples = [_get_content(h, None) for h in history]
+        examples, n_dropped = fit_texts(examples, self.lt_memory_max_tokens, model)
+        report_dropped(getattr(self, "role", None), "long-term memory examples", n_dropped)
+
+        content = []
+        for i, e in enumerate(examples):
+            content.append(f"[Example {i + 1}]\n" + e)
+        content = "\n".join(content)
+        messages = [{"role": "system", "content": content}]
+
+        self._lt_memory_cache[cache_key] = [dict(m) for m in messages]
+        if len(self._lt_memory_cache) > 8:
+            self._lt_memory_cache.popitem(last=False)
         return messages
 
     def store_long_term_memory(self, summary: Any,
@@ -109,18 +150,40 @@ class MemoryMechanism:
         messages = []
         if self.st_memory_store is not None:
             history: List[Dict] = self.st_memory_store.similarity_search(k=self.n_short_message_history)
-            for n, h in enumerate(history):
-                msg = f"[Article {n + 1} Recent records]"
-                for k, v in h.items():
-                    v_str = any_to_str(v)
-                    msg += f"\n{k}: {v_str}"
-                messages.append(msg)
+            records = []
+            for h in history:
+                records.append("".join(f"\n{k}: {any_to_str(v)}" for k, v in h.items()))
+            # The oldest records are dropped first
+            records, n_dropped = fit_texts(records, self.st_memory_max_tokens, self._token_model())
+            report_dropped(getattr(self, "role", None), "short-term memory records", n_dropped)
+            for n, record in enumerate(records):
+                messages.append(f"[Article {n + 1} Recent records]" + record)
         if len(messages) != 0:
             content = "The following is a record of the most recent tasks performed. Consider how these execution records relate to the current task and draw on these experiences to complete the new task.\n"
             content += '\n'.join(messages)
             messages = [{"role": "system", "content": content}]
         return messages
 
+    def prefetch_memory(self, desc: Any) -> Future:
+        """
+        Start retrieving the long-term and short-term memory in the background, so that the embedding call
+        overlaps with building the step prompt. UI inspection stays on the calling thread.
+
+        Parameter:
+            desc: Any, Description of the current task, see retrieve_long_term_memory
+        Return:
+            Future, resolves to (long-term memory messages, short-term memory messages)
+        """
+        def retrieve():
+            return self.retrieve_long_term_memory(desc), self.retrieve_short_term_memory()
+
+        if config["prefetch_memory"]:
+            # The retrieval runs in the session of the caller
+            return _memory_executor.submit(contextvars.copy_context().run, retrieve)
+        future = Future()
+        future.set_result(retrieve())
+        return future
+
     def store_short_term_memory(self, messages: Union[List[Dict], Dict]) -> None:
         """
         Storing messages into short-term memory
@@ -131,6 +194,8 @@ class MemoryMechanism:
         if self.st_memory_store is None:
             return
         self.st_memory_store.add(messages=messages)
+        if self._branch_records is not None:
+            self._branch_records.append(messages)
 
 
 class BrainMechanism:
@@ -142,6 +207,8 @@ class BrainMechanism:
     role: RoleType = None  # Role played by cola, such as planner, executor, evaluator, etc.
     agents_capability: Dict[str, str] = None  # Description of the agent's capabilities
     cdc: ContextualDataCenter = None  # Data Center for Recording Context
+    max_context_tokens: Optional[int] = None  # token budget of a whole request, images are not counted
+    stable_prefix: bool = False  # order the request so that its prefix stays the same across steps
 
     def __init__(self, **kwargs):
         # A complete request is episodic_messages + linked_messages + query_messages + tip_messages
@@ -191,7 +258,7 @@ class BrainMechanism:
         if verify:
             assert format_model is not None, f"{self.__class__}: format_model is None, please provide a format_model."
             try:
-                data = format_model(**data)
+                data = format_model.model_validate(data)
                 return data.model_dump()
             except ValidationError as e:
                 # If the json key is incorrect, add a response to the error in tip_messages
@@ -206,6 +273,20 @@ class BrainMechanism:
                 raise LMResponseFormatError(feedback)
         return data
 
+    def _count_request(self) -> None:
+        # Record the number of requests and terminate the program when the number of requests reaches a preset upper limit
+        self.request_times += 1
+        if self.request_times >= self.max_query_times:
+            raise MaxQueryTimesError(
+                "{} has reached the maximum number of requests. Request times: {}".format(self.role, self.request_times)
+            )
+
+    def _need_retry(self, use_openai_format: bool, format_model: Type[BaseModel], extract_json: bool) -> bool:
+        # If max_retry_times is None, or if openai json format support is used, or if extract_json is not performed, then no retries are performed
+        return not ((self.max_retry_times is None) or
+                    (use_openai_format and format_model is not None) or
+                    (not extract_json))
+
     def query(self, query_messages: List[Dict[str, str]] = None,
               episodic_messages: List[Dict[str, str]] = None,
               linked_messages: List[Dict[str, str]] = None,
@@ -216,17 +297,9 @@ class BrainMechanism:
               **kwargs) -> Tuple[str, Dict]:
         """The query method with error handling, see _query() for arguments.
         """
-        # Record the number of requests and terminate the program when the number of requests reaches a preset upper limit
-        self.request_times += 1
-        if self.request_times >= self.max_query_times:
-            raise MaxQueryTimesError(
-                "{} has reached the maximum number of requests. Request times: {}".format(self.role, self.request_times)
-            )
+        self._count_request()
 
-        # If max_retry_times is None, or if openai json format support is used, or if extract_json is not performed, then no retries are performed
-        if ((self.max_retry_times is None) or
-                (use_openai_format and format_model is not None) or
-                (not extract_json)):
+        if not self._need_retry(use_openai_format, format_model, extract_json):
             return self._query(
                 query_messages, episodic_messages, linked_messages, verify,
                 use_openai_format, format_model, extract_json, **kwargs
@@ -247,31 +320,40 @@ class BrainMechanism:
             f"LM response was formatted incorrectly and the maximum number of retries has been reached. Retry times: {self.max_retry_times}"
         )
 
-    def _query(self, query_messages: List[Dict[str, str]] = None,
-               episodic_messages: List[Dict[str, str]] = None,
-               linked_messages: List[Dict[str, str]] = None,
-               verify: bool = True,
-               use_openai_format: bool = True,
-               format_model: Type[BaseModel] = None,
-               extract_json: bool = True,
-               func_branch: Optional[str] = None,
-               **kwargs) -> Tuple[str, Dict]:
+    async def aquery(self, query_messages: List[Dict[str, str]] = None,
+                     episodic_messages: List[Dict[str, str]] = None,
+                     linked_messages: List[Dict[str, str]] = None,
+                     verify: bool = True,
+                     use_openai_format: bool = True,
+                     format_model: Type[BaseModel] = None,
+                     extract_json: bool = True,
+                     **kwargs) -> Tuple[str, Dict]:
+        """The non-blocking version of query(), see _query() for arguments.
         """
-        Sends a request to the LM and handles the LM's response
+        self._count_request()
 
-        Parameter:
-            query_messages: List[Dict[str, str]], Request message for the current task
-            episodic_messages: List[Dict[str, str]], Messages containing system templates and historical memory
-            linked_messages: List[Dict[str, str]], News from short-term memory
-            verify: bool, Whether the format needs to be validated, see extract_json()
-            use_openai_format: bool, Whether to use openai's json format support
-            format_model: Type[pydantic.BaseModel], Validate the model of the format, see extract_json()
-            extract_json: bool, Whether to extract json data
-            func_branch: Optional[str], Used to mark what the function is called by, optionally “Error correction”, “Human Feedback”.
+        if not self._need_retry(use_openai_format, format_model, extract_json):
+            return await self._aquery(
+                query_messages, episodic_messages, linked_messages, verify,
+                use_openai_format, format_model, extract_json, **kwargs
+            )
+        retry_times = 0
+        while retry_times <= self.max_retry_times:
+            try:
+                return await self._aquery(
+                    query_messages, episodic_messages, linked_messages, verify,
+                    use_openai_format, format_model, extract_json, **kwargs
+                )
+            except LMResponseFormatError as e:
+                self.tip_messages.append(self.prompter.create_user_prompt(str(e)))
+                retry_times += 1
+        raise MaxRetryTimesError(
+            f"LM response was formatted incorrectly and the maximum number of retries has been reached. Retry times: {self.max_retry_times}"
+        )
 
-        Return:
-            Tuple[str, Dict], Raw response and extracted json data, if extract_json is False, then return an empty dictionary.
-        """
+    def _prepare_messages(self, query_messages: List[Dict[str, str]] = None,
+                          episodic_messages: List[Dict[str, str]] = None,
+                          linked_messages: List[Dict[str, str]] = None) -> Tuple[List, List, List]:
         assert self.brain is not None, f"{self.__class__} - brain is None. Please check if the brain is initialized."
 
         if episodic_messages is None:
@@ -281,11 +363,40 @@ class BrainMechanism:
         if query_messages is None:
             query_messages = self.query_messages
 
-        # Get the original response from LM
-        origin_response = self.brain.query(
-            episodic_messages + linked_messages + query_messages + self.tip_messages,
-            response_format=format_model if use_openai_format else None
-        )
+        # Final guard, drop the short-term and then the long-term memory messages when the request is over budget
+        episodic_messages, linked_messages, dropped = fit_context(
+            query_messages + self.tip_messages, episodic_messages, linked_messages,
+            self.max_context_tokens, getattr(self.brain, "model", None))
+        report_dropped(self.role, "short-term memory messages", dropped["linked_messages"])
+        report_dropped(self.role, "long-term memory messages", dropped["episodic_messages"])
+        return query_messages, episodic_messages, linked_messages
+
+    def _assemble_request(self, query_messages: List[Dict[str, str]],
+                          episodic_messages: List[Dict[str, str]],
+                          linked_messages: List[Dict[str, str]]) -> List[Dict]:
+        """Order the messages of a request.
+
+        By default the order is episodic_messages + linked_messages + query_messages + tip_messages.
+        With stable_prefix, only the system prompt stays in front. The retrieved long-term examples and the
+        short-term memory, which change from step to step, are moved after the previous Q/R messages of the task,
+        right before the current query, so that providers can reuse the cached prefix.
+        """
+        if not self.stable_prefix:
+            return episodic_messages + linked_messages + query_messages + self.tip_messages
+        # The long-term examples are system messages too, only the first episodic message is the system prompt
+        return (episodic_messages[:1] + query_messages[:-1] + episodic_messages[1:] + linked_messages
+                + query_messages[-1:] + self.tip_messages)
+
+    def _handle_response(self, origin_response: Any,
+                         query_messages: List[Dict[str, str]],
+                         episodic_messages: List[Dict[str, str]],
+                         linked_messages: List[Dict[str, str]],
+                         verify: bool = True,
+                         use_openai_format: bool = True,
+                         format_model: Type[BaseModel] = None,
+                         extract_json: bool = True,
+                         func_branch: Optional[str] = None) -> Tuple[str, Dict, Dict]:
+        """Extract, log and record the LM's response. Returns the raw response, the extracted json data and the query parameters."""
         if use_openai_format and (format_model is not None):
             response = origin_response.dict()
             origin_response = "```json\n" + json.dumps(response, indent=4) + "\n```"
@@ -298,7 +409,7 @@ class BrainMechanism:
         self.tip_messages.clear()
         # Store logs, error correction mechanisms are transparent and not logged
         query_messages.append(self.prompter.create_ai_prompt(origin_response))
-        cm_logger.log(
+        self.session.logger.log(
             episodic_messages + linked_messages + query_messages,
             role=self.role
         )
@@ -313,10 +424,52 @@ class BrainMechanism:
             func_branch=func_branch
         )
         self.cdc.set_query_params(self.role, (query_messages, _params))
+        return origin_response, response, _params
+
+    def _need_human_feedback(self, response: Dict) -> bool:
+        return bool((response and ("branch" in response) and (response["branch"] == "NeedHumanHelp")) or (
+                self.interact_mode == "proactive"))
+
+    def _query(self, query_messages: List[Dict[str, str]] = None,
+               episodic_messages: List[Dict[str, str]] = None,
+               linked_messages: List[Dict[str, str]] = None,
+               verify: bool = True,
+               use_openai_format: bool = True,
+               format_model: Type[BaseModel] = None,
+               extract_json: bool = True,
+               func_branch: Optional[str] = None,
+               **kwargs) -> Tuple[str, Dict]:
+        """
+        Sends a request to the LM and handles the LM's response
+
+        Parameter:
+            query_messages: List[Dict[str, str]], Request message for the current task
+            episodic_messages: List[Dict[str, str]], Messages containing system templates and historical memory
+            linked_messages: List[Dict[str, str]], News from short-term memory
+            verify: bool, Whether the format needs to be validated, see extract_json()
+            use_openai_format: bool, Whether to use openai's json format support
+            format_model: Type[pydantic.BaseModel], Validate the model of the format, see extract_json()
+            extract_json: bool, Whether to extract json data
+            func_branch: Optional[str], Used to mark what the function is called by, optionally “Error correction”, “Human Feedback”.
+
+        Return:
+            Tuple[str, Dict], Raw response and extracted json data, if extract_json is False, then return an empty dictionary.
+        """
+        query_messages, episodic_messages, linked_messages = self._prepare_messages(
+            query_messages, episodic_messages, linked_messages)
+
+        # Get the original response from LM
+        origin_response = self.brain.query(
+            self._assemble_request(query_messages, episodic_messages, linked_messages),
+            response_format=format_model if use_openai_format else None
+        )
+        origin_response, response, _params = self._handle_response(
+            origin_response, query_messages, episodic_messages, linked_messages, verify,
+            use_openai_format, format_model, extract_json, func_branch
+        )
 
         # Handle manual feedback branches, process them here to avoid context and parameter loss
-        if (response and ("branch" in response) and (response["branch"] == "NeedHumanHelp")) or (
-                self.interact_mode == "proactive"):
+        if self._need_human_feedback(response):
             _origin_response, _response = self.human_feedback_step(
                 False, origin_response, query_messages, **_params
             )
@@ -326,26 +479,60 @@ class BrainMechanism:
 
         return origin_response, response
 
+    async def _aquery(self, query_messages: List[Dict[str, str]] = None,
+                      episodic_messages: List[Dict[str, str]] = None,
+                      linked_messages: List[Dict[str, str]] = None,
+                      verify: bool = True,
+                      use_openai_format: bool = True,
+                      format_model: Type[BaseModel] = None,
+                      extract_json: bool = True,
+                      func_branch: Optional[str] = None,
+                      **kwargs) -> Tuple[str, Dict]:
+        """The non-blocking version of _query(), the LM request is awaited so that other requests can be in flight."""
+        query_messages, episodic_messages, linked_messages = self._prepare_messages(
+            query_messages, episodic_messages, linked_messages)
+
+        origin_response = await self.brain.aquery(
+            self._assemble_request(query_messages, episodic_messages, linked_messages),
+            response_format=format_model if use_openai_format else None
+        )
+        origin_response, response, _params = self._handle_response(
+            origin_response, query_messages, episodic_messages, linked_messages, verify,
+            use_openai_format, format_model, extract_json, func_branch
+        )
+
+        # Human feedback waits for console input, keep it off the event loop
+        if self._need_human_feedback(response):
+            _origin_response, _response = await asyncio.to_thread(
+                self.human_feedback_step, False, origin_response, query_messages, **_params
+            )
+            if _origin_response == "skip" and _response == "skip":
+                return origin_response, response
+            return _origin_response, _response
+
+        return origin_response, response
+
     def human_feedback_step(self, handoff: bool, response: str = None, query_messages: List[Dict] = None, **kwargs):
         """Handle manual feedback. The method may need to be rewritten to accommodate different role requirements.
 
         By default, this method is called automatically in _query(), make sure that the output json contains the `branch` parameter and only call this method if it is `NeedHumanHelp`.
         """
-        # If human_feedback_step was called by handoff, the last response is printed.
-        if handoff:
-            print_with_color(f"Switch to `{self.role}`. Last Response is follow:", "blue")
-            print(self.query_messages[-1]["content"])
-            print_with_color(f"{self.role} has been answered, please give guidance: ", "red")
-        else:
-            if self.interact_mode == "proactive":
+        with _console_lock:
+            # If human_feedback_step was called by handoff, the last response is printed.
+            if handoff:
+                print_with_color(f"Switch to `{self.role}`. Last Response is follow:", "blue")
+                print(self.query_messages[-1]["content"])
                 print_with_color(f"{self.role} has been answered, please give guidance: ", "red")
             else:
-                print_with_color(f"{self.role} have encountered some problems, please give some advice: ", "red")
-
-        # Open the recorded markdown file to facilitate human observation of the requested information and advise accordingly
-        if config["open_markdown_for_human_feedback"]:
-            os.startfile(cm_logger.role_last_md_path[self.role])
-        feedback = input("Please input feedback (Enter 'skip' or 'switch to ***' to perform special operations): \n")
+                if self.interact_mode == "proactive":
+                    print_with_color(f"{self.role} has been answered, please give guidance: ", "red")
+                else:
+                    print_with_color(f"{self.role} have encountered some problems, please give some advice: ", "red")
+
+            # Open the recorded markdown file to facilitate human observation of the requested information and advise accordingly
+            if config["open_markdown_for_human_feedback"]:
+                os.startfile(self.session.logger.role_last_md_path[self.role])
+            feedback = input("Please input feedback (Enter 'skip' or 'switch to ***' to perform special operations): \n")
         if feedback == "skip":
             return "skip", "skip"
         if query_messages is None:
@@ -389,6 +576,11 @@ class BaseRole(ABC, MemoryMechanism, BrainMechanism, metaclass=Singleton):
                  short_term_memory_store: Optional[BaseMemory] = None,
                  n_chat_message_history: int = 2,
                  n_short_message_history: int = 5,
+                 lt_memory_score_threshold: Optional[float] = None,
+                 lt_memory_max_tokens: Optional[int] = None,
+                 st_memory_max_tokens: Optional[int] = None,
+                 max_context_tokens: Optional[int] = None,
+                 stable_prefix: bool = False,
                  max_retry_times: int = 3,
                  max_query_times: int = 20,
                  interact_mode: str = None, ):
@@ -404,6 +596,11 @@ class BaseRole(ABC, MemoryMechanism, BrainMechanism, metaclass=Singleton):
         self.st_memory_store = short_term_memory_store
         self.n_chat_message_history = n_chat_message_history
         self.n_short_message_history = n_short_message_history
+        self.lt_memory_score_threshold = lt_memory_score_threshold
+        self.lt_memory_max_tokens = lt_memory_max_tokens
+        self.st_memory_max_tokens = st_memory_max_tokens
+        self.max_context_tokens = max_context_tokens
+        self.stable_prefix = stable_prefix
 
         self.max_retry_times = max_retry_times
         self.max_query_times = max_query_times
@@ -411,7 +608,8 @@ class BaseRole(ABC, MemoryMechanism, BrainMechanism, metaclass=Singleton):
         self.agents_capability = agents_capability
         self.interact_mode = interact_mode
 
-        self.cdc = ContextualDataCenter()
+        self.session: Session = get_session()  # the session the role belongs to
+        self.cdc = self.session.cdc
 
     def has_event(self, event: WorkflowEvent) -> bool:
         return event in self.handle
@@ -449,18 +647,62 @@ class BaseRole(ABC, MemoryMechanism, BrainMechanism, metaclass=Singleton):
             summary = task
         return summary
 
+    def build_step_messages(self, system_prompt: Dict, user_prompt: Callable[[], Dict]) -> None:
+        """
+        Set the messages of the next query. The memory of the task is retrieved in the background
+        while the user prompt is built, which may inspect the UI.
+
+        Parameter:
+            system_prompt: Dict, The system prompt of the role
+            user_prompt: Callable[[], Dict], Builds the user prompt of the step
+        """
+        memory = self.prefetch_memory(self.generate_summary())
+        self.query_messages = [user_prompt()]
+        lt_messages, self.linked_messages = memory.result()
+        self.episodic_messages = [system_prompt, *lt_messages]
+
     def handle_store_memory(self, session_id: Optional[str] = None,
                             summary: Any = None,
                             mode: str = "cw"):
         if summary is None:
             summary = self.generate_summary()
-        if session_id is None and config["session_id"]:
-            session_id = config["session_id"]
+        if session_id is None and self.session.config["session_id"]:
+            session_id = self.session.config["session_id"]
         if summary is not None:
             self.store_long_term_memory(
                 summary=summary, session_id=session_id, mode=mode,
             )
 
+    def fork(self) -> "BaseRole":
+        """
+        A copy of the role for a parallel distribution entry, see Workflow._run_branch.
+        The copy starts from the short-term memory of the role, and keeps its own messages, recorded steps
+        and tracking state, so that the entries running at the same time do not see each other's steps.
+        """
+        branch = copy.copy(self)
+        branch.handle = {}
+        branch._register_all_event()
+        branch._lt_memory_cache = OrderedDict()
+        branch.episodic_messages, branch.linked_messages, branch.query_messages = [], [], []
+        branch.tip_messages, branch.session_messages = [], []
+        branch.request_times = 0
+        if self.session_step is not None:
+            branch.session_step = {key: [] for key in self.session_step}
+        if self.st_memory_store is not None:
+            branch.st_memory_store = copy.deepcopy(self.st_memory_store)
+            branch._branch_records = []
+        return branch
+
+    def merge(self, branch: "BaseRole") -> None:
+        """Add the steps and the short-term memory recorded by a fork of the role, see fork()."""
+        if self.session_step is not None:
+            for key, steps in branch.session_step.items():
+                self.session_step.setdefault(key, []).extend(steps)
+        for messages in branch._branch_records or []:
+            self.store_short_term_memory(messages)
+        self.session_messages.extend(branch.session_messages)
+        self.request_times += branch.request_times
+
     def branch_step(self, response: Dict, **kwargs) -> PrivateData:
         return PrivateData(**response)
 
@@ -471,20 +713,22 @@ class BaseRole(ABC, MemoryMechanism, BrainMechanism, metaclass=Singleton):
 
     def step(self, event: WorkflowEvent = None, data: PrivateData = None,
              handoff: bool = False, **kwargs) -> Optional[PrivateData]:
-        if not handoff:
-            data = self.cdc.prepare_data(self.role, data)
-            self.cdc.set_context(self.role, data)  # save context to cdc session record space
-
-        if event is None:
-            event = data.event
-            if not WorkflowEvent.contains(event):
-                raise ValueError(f"event {event} is not in {WorkflowEvent.to_str()}.")
-        if data is None and kwargs is None:
-            raise ValueError("data and kwargs is None.")
-        if not self.has_event(event):
-            raise ValueError(f"event {event} is not handled in `{self.role}`.")
-
-        step_data: Optional[PrivateData] = self.handle[event](data=data, handoff=handoff, **kwargs)
-        if step_data:
-            cm_logger.log_data(step_data, "data")
-        return step_data
+        # The prompters, the operations and the logs of the step belong to the session of the role
+        with use_session(self.session):
+            if not handoff:
+                data = self.cdc.prepare_data(self.role, data)
+                self.cdc.set_context(self.role, data)  # save context to cdc session record space
+
+            if event is None:
+                event = data.event
+                if not WorkflowEvent.contains(event):
+                    raise ValueError(f"event {event} is not in {WorkflowEvent.to_str()}.")
+            if data is None and kwargs is None:
+                raise ValueError("data and kwargs is None.")
+            if not self.has_event(event):
+                raise ValueError(f"event {event} is not handled in `{self.role}`.")
+
+            step_data: Optional[PrivateData] = self.handle[event](data=data, handoff=handoff, **kwargs)
+            if step_data:
+                self.session.logger.log_data(step_data, "data")
+            return step_data
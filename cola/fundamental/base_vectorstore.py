@@ -42,6 +42,12 @@ class BaseVectorStore(ABC):
     ) -> List[Tuple[str, float]]:
         """Return docs most similar to query."""
 
+    def similarity_search_batch(
+            self, embeddings: List[List[float]], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
+    ) -> List[List[Tuple[str, float]]]:
+        """Return docs most similar to each query, in the order of the queries."""
+        return [self.similarity_search(embedding, k, score_threshold, **kwargs) for embedding in embeddings]
+
     def __contains__(self, item):
         raise NotImplementedError("__contains__ method must be implemented by subclass.")
 
@@ -50,5 +56,5 @@ class BaseVectorStore(ABC):
         """Save vectorstore to disk."""
 
     @classmethod
-    def load_vectorstore(cls, path: Union[str, Path], file_name: str) -> "BaseVectorStore":
+    def load_vectorstore(cls, path: Union[str, Path], file_name: str, **kwargs: Any) -> "BaseVectorStore":
         """load vectorstore from disk."""
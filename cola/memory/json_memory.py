@@ -1,23 +1,74 @@
+import os
+import json
 import uuid
+import threading
 from cola.fundamental import BaseMemory, BaseEmbedding, BaseVectorStore, BaseSummarization
-from typing import Optional, List, Union, Any, Tuple, Dict
+from typing import Optional, List, Union, Any, Tuple, Dict, Iterator
 from pathlib import Path
 from cola.utils.json_utils import save_json, load_json
 
 
+def iter_jsonl_memory(jsonl_path: Union[str, Path]) -> Iterator[Tuple[str, Any]]:
+    """Iterate over the (session_id, value) records of a memory saved as JSONL."""
+    with open(jsonl_path, "r", encoding="utf8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield record["session_id"], record["value"]
+
+
+def read_memory_file(path: Union[str, Path], file_name: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Read a memory saved by JsonChatMessageMemory, return its json_memory and summary_dict.
+
+    Memories are saved as {file_name}.jsonl, one session per line, with an index {file_name}.index.json
+    holding the summaries and the byte offset of every session. Memories saved as a single {file_name}.json
+    by older versions are read as well.
+    """
+    path = Path(path)
+    index_path = path / f"{file_name}.index.json"
+    if index_path.exists():
+        summary_dict = load_json(index_path)["summary_dict"]
+        return dict(iter_jsonl_memory(path / f"{file_name}.jsonl")), summary_dict
+    data = load_json(path / f"{file_name}.json")
+    return data["json_memory"], data["summary_dict"]
+
+
 class JsonChatMessageMemory(BaseMemory):
     def __init__(self, embedding: Optional[BaseEmbedding] = None,
                  vectorstore: Optional[BaseVectorStore] = None,
                  summarizer: Optional[BaseSummarization] = None):
         self.json_memory: Dict[str, List] = {}  # uuid: messages
         self.summary_dict: Dict[str, str] = {}  # uuid: summary
+        self.summary_index: Dict[str, Dict[str, None]] = {}  # summary: ordered set of uuids with that summary
 
         self.embedding = embedding
         self.vectorstore = vectorstore
         self.summarizer = summarizer
 
+        # Sessions of a lazily loaded memory that are not paged in yet, uuid: (offset, length) in the source file
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._source: Optional[Path] = None
+        self._lock = threading.RLock()
+
+    def _page_in(self, session_id: str) -> bool:
+        """Make sure the session is in json_memory, return False if it does not exist."""
+        with self._lock:
+            if session_id in self.json_memory:
+                return True
+            if session_id not in self._offsets:
+                return False
+            offset, length = self._offsets.pop(session_id)
+            with open(self._source, "rb") as f:
+                f.seek(offset)
+                self.json_memory[session_id] = json.loads(f.read(length))["value"]
+            return True
+
+    def warm_up(self):
+        """Page in all the sessions of a lazily loaded memory."""
+        for session_id in list(self._offsets):
+            self._page_in(session_id)
+
     def get(self, session_id: str) -> List[Tuple[str, str]]:
-        return self.json_memory.get(session_id, [])
+        return self.json_memory[session_id] if self._page_in(session_id) else []
 
     def add(self, session_id: Optional[str] = None,
             summary: str = None,
@@ -40,62 +91,86 @@ class JsonChatMessageMemory(BaseMemory):
         if summary is None:
             summary = self.summarizer.summarize(messages=messages)
 
-        # If the summary already exists in memory, set the session_id to the session_id for the summary
-        is_exist = False
-        if session_id is None:
-            for k, v in self.summary_dict.items():
-                if summary == v:
-                    session_id = k
-                    is_exist = True
-        # If the summary does not exist in memory, check if the session_id exists
-        if not is_exist and session_id is not None:
-            if session_id in self.json_memory:
+        # The warm-up thread pages sessions in while the memory changes
+        with self._lock:
+            # If the summary already exists in memory, set the session_id to the session_id for the summary
+            is_exist = False
+            if session_id is None and self.summary_index.get(summary):
+                # The latest session with this summary
+                session_id = next(reversed(self.summary_index[summary]))
                 is_exist = True
+            # If the summary does not exist in memory, check if the session_id exists
+            if not is_exist and session_id is not None:
+                if self._page_in(session_id):
+                    is_exist = True
 
-        # If the same summary/session_id exists
-        if is_exist and mode == "cw":  # and is in “cw” mode, then the original record is deleted.
-            self.delete(session_id)
-            is_exist = False
-        elif is_exist and mode == "w":  # and is in “w” mode, then session_id is returned and the write is canceled.
-            return ""
+            # If the same summary/session_id exists
+            if is_exist and mode == "cw":  # and is in “cw” mode, then the original record is deleted.
+                self.delete(session_id)
+                is_exist = False
+            elif is_exist and mode == "w":  # and is in “w” mode, then session_id is returned and the write is canceled.
+                return ""
 
-        if session_id is None:
-            session_id = str(uuid.uuid4()).replace("-", "")
+            if session_id is None:
+                session_id = str(uuid.uuid4()).replace("-", "")
 
-        if session_id not in self.json_memory:
-            self.json_memory[session_id] = []
-        self.json_memory[session_id].extend(messages)
+            self.version += 1
+            if not self._page_in(session_id):
+                self.json_memory[session_id] = []
+            self.json_memory[session_id].extend(messages)
 
-        if not is_exist:
-            self.summary_dict[session_id] = summary  # 存储 summary
-            summary_embedding = self.embedding.embed_query(summary)
-            if session_id in self.vectorstore:
-                self.vectorstore.delete([session_id])
-            self.vectorstore.add_embeddings([session_id], [summary_embedding])
-        return session_id
+            if not is_exist:
+                self.summary_dict[session_id] = summary  # 存储 summary
+                self.summary_index.setdefault(summary, {})[session_id] = None
+                summary_embedding = self.embedding.embed_query(summary)
+                if session_id in self.vectorstore:
+                    self.vectorstore.delete([session_id])
+                self.vectorstore.add_embeddings([session_id], [summary_embedding])
+            return session_id
 
     def similarity_search(
             self, text: Union[str, Any], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
     ) -> List[Union[str, Any]]:
         embedding = self.embedding.embed_query(text)
         key_and_score = self.vectorstore.similarity_search(embedding, k, score_threshold)
-        session_ids = set([k for k, _ in key_and_score])
+        # Deduplicate while keeping the most similar first
+        session_ids = dict.fromkeys(k for k, _ in key_and_score)
         histories = [self.get(session_id) for session_id in session_ids]
         return histories
 
+    def similarity_search_batch(
+            self, texts: List[str], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
+    ) -> List[List[Union[str, Any]]]:
+        """Search several texts at once, they are embedded with batched requests and searched with one index search."""
+        if not texts:
+            return []
+        embeddings = self.embedding.embed_documents(texts)
+        results = self.vectorstore.similarity_search_batch(embeddings, k, score_threshold)
+        return [[self.get(session_id) for session_id in dict.fromkeys(key for key, _ in key_and_score)]
+                for key_and_score in results]
+
     def delete(self, session_id: Optional[Union[List[str], str]] = None):
         if isinstance(session_id, str):
             session_id = [session_id]
-        # If session_id is None, all session_ids are deleted.
-        if session_id is None:
-            session_id = self.summary_dict.keys()
-        for i in session_id:
-            if i in self.json_memory:
-                del self.json_memory[i]
-        self.vectorstore.delete(session_id)
-        self.summary_dict = {k: v for k, v in self.summary_dict.items() if k not in session_id}
+        with self._lock:
+            # If session_id is None, all session_ids are deleted.
+            if session_id is None:
+                session_id = list(self.summary_dict.keys())
+            session_id = list(dict.fromkeys(session_id))
+            self.version += 1
+            for i in session_id:
+                self.json_memory.pop(i, None)
+                self._offsets.pop(i, None)
+                summary = self.summary_dict.pop(i, None)
+                if summary is not None:
+                    session_ids = self.summary_index[summary]
+                    session_ids.pop(i, None)
+                    if not session_ids:
+                        del self.summary_index[summary]
+            self.vectorstore.delete(session_id)
 
     def get_all_memory(self):
+        self.warm_up()
         return self.json_memory
 
     def save_memory(self, path: Union[str, Path], file_name: str):
@@ -103,19 +178,70 @@ class JsonChatMessageMemory(BaseMemory):
             path = Path(path)
         if not path.exists():
             path.mkdir(parents=True)
-        data = {"json_memory": self.json_memory, "summary_dict": self.summary_dict}
-        save_json(path / f"{file_name}.json", data, indent=4)
+        jsonl_path = path / f"{file_name}.jsonl"
+        index_path = path / f"{file_name}.index.json"
+
+        with self._lock:
+            offsets = {}
+            src = open(self._source, "rb") if self._offsets else None
+            try:
+                with open(str(jsonl_path) + ".tmp", "wb") as f:
+                    for session_id in list(self.json_memory) + list(self._offsets):
+                        if session_id in self.json_memory:
+                            record = json.dumps({"session_id": session_id, "value": self.json_memory[session_id]},
+                                                ensure_ascii=False).encode("utf8")
+                        else:
+                            # Copy the sessions that are not paged in without parsing them
+                            src.seek(self._offsets[session_id][0])
+                            record = src.read(self._offsets[session_id][1])
+                        offsets[session_id] = (f.tell(), len(record))
+                        f.write(record + b"\n")
+            finally:
+                if src is not None:
+                    src.close()
+            os.replace(str(jsonl_path) + ".tmp", jsonl_path)
+            save_json(str(index_path) + ".tmp", {"summary_dict": self.summary_dict, "offsets": offsets})
+            os.replace(str(index_path) + ".tmp", index_path)
+
+            if self._offsets:
+                self._offsets = {session_id: offsets[session_id] for session_id in self._offsets}
+                self._source = jsonl_path
         self.vectorstore.save_vectorstore(path, file_name)
 
-    def load_memory(self, path: Union[str, Path], file_name: str):
+    def load_memory(self, path: Union[str, Path], file_name: str, lazy: bool = False, warm_up: bool = False,
+                    **kwargs):
+        """
+        Load the memory saved by save_memory.
+
+        Parameter:
+            lazy: bool, Only load the summaries and the vectors, the sessions are paged in when they are retrieved.
+            warm_up: bool, Page in the sessions of a lazily loaded memory in a background thread.
+            kwargs: passed to the load_vectorstore of the vectorstore.
+        """
         if isinstance(path, str):
             path = Path(path)
         if not path.exists():
             raise FileNotFoundError(f"File {path} not found!.")
-        self.vectorstore = self.vectorstore.load_vectorstore(path, file_name)
-        data = load_json(path / f"{file_name}.json")
-        self.json_memory = data["json_memory"]
-        self.summary_dict = data["summary_dict"]
+        self.vectorstore = self.vectorstore.load_vectorstore(path, file_name, **kwargs)
+
+        index_path = path / f"{file_name}.index.json"
+        with self._lock:
+            if lazy and index_path.exists():
+                index = load_json(index_path)
+                self.json_memory = {}
+                self.summary_dict = index["summary_dict"]
+                self._offsets = {session_id: tuple(offset) for session_id, offset in index["offsets"].items()}
+                self._source = path / f"{file_name}.jsonl"
+            else:
+                self.json_memory, self.summary_dict = read_memory_file(path, file_name)
+                self._offsets = {}
+            self.summary_index = {}
+            for session_id, summary in self.summary_dict.items():
+                self.summary_index.setdefault(summary, {})[session_id] = None
+            self.version += 1
+
+        if self._offsets and warm_up:
+            threading.Thread(target=self.warm_up, daemon=True).start()
         return self
 
 
@@ -126,17 +252,30 @@ class JsonStringMemory(JsonChatMessageMemory):
         self.json_memory: Dict[str, str] = {}
 
     def get(self, session_id: str) -> str:
-        return self.json_memory.get(session_id, "")
+        return self.json_memory[session_id] if self._page_in(session_id) else ""
 
     def add(self, session_id: Optional[str] = None, summary: str = None, store: str = None) -> str:
         if session_id is None:
             session_id = str(uuid.uuid4()).replace("-", "")
-        if session_id not in self.json_memory:
-            self.json_memory[session_id] = ""
-        self.json_memory[session_id] = store
-
         summary_embedding = self.embedding.embed_query(summary)
-        if session_id in self.vectorstore:
-            self.vectorstore.delete([session_id])
-        self.vectorstore.add_embeddings([session_id], [summary_embedding])
+        with self._lock:
+            self._offsets.pop(session_id, None)
+            self.json_memory[session_id] = store
+            self.version += 1
+            if session_id in self.vectorstore:
+                self.vectorstore.delete([session_id])
+            self.vectorstore.add_embeddings([session_id], [summary_embedding])
         return session_id
+
+    def add_batch(self, summaries: List[str], stores: List[str]) -> List[str]:
+        """Add new records in bulk, the summaries are embedded with batched requests."""
+        if not summaries:
+            return []
+        session_ids = [str(uuid.uuid4()).replace("-", "") for _ in summaries]
+        summary_embeddings = self.embedding.embed_documents(summaries)
+        with self._lock:
+            for session_id, store in zip(session_ids, stores):
+                self.json_memory[session_id] = store
+            self.version += 1
+            self.vectorstore.add_embeddings(session_ids, summary_embeddings)
+        return session_ids
@@ -1,40 +1,82 @@
 from cola.fundamental import BaseMemory
-from typing import List, Dict, Union, Any
+from typing import List, Dict, Union, Any, Iterator, Optional
 from cola.utils.json_utils import save_json, load_json
+from cola.utils.token_utils import count_record_tokens
+from collections import deque
 from pathlib import Path
 
 
 class QueueMemory(BaseMemory):
-    def __init__(self):
-        self.memory = []
+    """Short-term memory kept as a ring buffer, the oldest records are evicted first.
+
+    Parameter:
+        capacity: Optional[int], Maximum number of records, None means unbounded
+        max_tokens: Optional[int], Maximum number of tokens of all the records, None means unbounded.
+            The latest record is always kept, even if it exceeds the budget alone.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, max_tokens: Optional[int] = None):
+        self.capacity = capacity
+        self.max_tokens = max_tokens
+        self.memory = deque()
+        self._tokens = deque()  # number of tokens of each record, only counted with a token budget
+        self.n_tokens = 0
+
+    def _evict(self):
+        while len(self.memory) > 1 and (
+                (self.capacity is not None and len(self.memory) > self.capacity) or
+                (self.max_tokens is not None and self.n_tokens > self.max_tokens)):
+            self.memory.popleft()
+            if self._tokens:
+                self.n_tokens -= self._tokens.popleft()
+
+    def _append(self, record: Dict):
+        self.memory.append(record)
+        if self.max_tokens is not None:
+            n_tokens = count_record_tokens(record)
+            self._tokens.append(n_tokens)
+            self.n_tokens += n_tokens
 
     def add(self, messages: Union[List[Dict], Dict], **kwargs):
         if isinstance(messages, Dict):
-            self.memory.append(messages)
+            self._append(messages)
         elif isinstance(messages, List):
-            self.memory.extend(messages)
+            for message in messages:
+                self._append(message)
         else:
             raise ValueError("messages should be a dict or a list of dict")
+        self._evict()
+        self.version += 1
+
+    def iter_recent(self, k: Optional[int] = None) -> Iterator[Dict]:
+        """Iterate over the last k records from the oldest to the latest, without copying the memory."""
+        length = len(self.memory)
+        start = 0 if k is None else max(length - k, 0)
+        for i in range(start, length):
+            # Indexing a deque close to one of its ends is O(1)
+            yield self.memory[i]
 
     def similarity_search(self, k: int | None = None, **kwargs) -> List[Union[str, Any]]:
-        if k is None:
-            return self.memory
-        if (length := len(self.memory)) <= k:
-            return self.memory
-        return self.memory[length - k:]
+        return list(self.iter_recent(k))
 
     def delete(self, index: int):
         del self.memory[index]
+        self.version += 1
+        if self._tokens:
+            self.n_tokens -= self._tokens[index]
+            del self._tokens[index]
 
     def get_all_memory(self):
-        return self.memory
+        return list(self.memory)
 
     def load_memory(self, path: Union[str, Path], file_name: str, **kwargs):
-        self.memory = load_json(Path(path) / (file_name + ".json"))
+        self.memory = deque()
+        self._tokens = deque()
+        self.n_tokens = 0
+        self.add(load_json(Path(path) / (file_name + ".json")))
 
     def save_memory(self, path: Union[str, Path], file_name: str, **kwargs):
         path = Path(path)
         if not path.exists():
             path.mkdir(parents=True, exist_ok=True)
-        save_json(path / (file_name + ".json"), self.memory)
-
+        save_json(path / (file_name + ".json"), list(self.memory))
@@ -0,0 +1,226 @@
+import uuid
+import json
+import hashlib
+import sqlite3
+import threading
+from cola.fundamental import BaseMemory, BaseEmbedding, BaseVectorStore, BaseSummarization
+from typing import Optional, List, Union, Any, Dict
+from pathlib import Path
+from cola.memory.json_memory import read_memory_file
+
+
+class SqliteChatMessageMemory(BaseMemory):
+    """Drop-in replacement of JsonChatMessageMemory that keeps the sessions in sqlite instead of in memory.
+
+    Every session is a row indexed by the hash of its summary, and its messages are rows of their own,
+    so only the messages of the retrieved sessions are read. Writes are collected in one transaction
+    that save_memory commits, a memory that is never saved leaves the database unchanged.
+    Until load_memory or save_memory binds it to a file, the database lives in memory.
+    """
+
+    def __init__(self, embedding: Optional[BaseEmbedding] = None,
+                 vectorstore: Optional[BaseVectorStore] = None,
+                 summarizer: Optional[BaseSummarization] = None):
+        self.embedding = embedding
+        self.vectorstore = vectorstore
+        self.summarizer = summarizer
+
+        self._lock = threading.RLock()
+        self.db_path: Optional[Path] = None
+        self.conn = self._connect(":memory:")
+
+    @staticmethod
+    def _connect(database: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(database, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                     "session_id TEXT PRIMARY KEY, summary TEXT NOT NULL, summary_hash TEXT NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_summary_hash ON sessions (summary_hash)")
+        conn.execute("CREATE TABLE IF NOT EXISTS messages ("
+                     "session_id TEXT NOT NULL, seq INTEGER NOT NULL, message TEXT NOT NULL, "
+                     "PRIMARY KEY (session_id, seq))")
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _hash(summary: str) -> str:
+        return hashlib.sha256(summary.encode("utf-8")).hexdigest()
+
+    def _find_summary(self, summary: str) -> Optional[str]:
+        # The latest session with this summary, as in JsonChatMessageMemory
+        row = self.conn.execute("SELECT session_id FROM sessions WHERE summary_hash = ? AND summary = ? "
+                                "ORDER BY rowid DESC LIMIT 1", (self._hash(summary), summary)).fetchone()
+        return None if row is None else row[0]
+
+    def _has_session(self, session_id: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def _append_messages(self, session_id: str, messages: List[Dict]):
+        start = self.conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?",
+                                  (session_id,)).fetchone()[0]
+        self.conn.executemany("INSERT INTO messages (session_id, seq, message) VALUES (?, ?, ?)",
+                              [(session_id, start + i, json.dumps(m, ensure_ascii=False))
+                               for i, m in enumerate(messages)])
+
+    def get(self, session_id: str) -> List[Dict]:
+        return self.get_many([session_id]).get(session_id, [])
+
+    def get_many(self, session_ids: List[str]) -> Dict[str, List[Dict]]:
+        """Fetch the messages of several sessions, the sessions without messages are left out."""
+        result: Dict[str, List[Dict]] = {}
+        with self._lock:
+            # Stay below the sqlite limit of host parameters per statement
+            for i in range(0, len(session_ids), 500):
+                chunk = session_ids[i:i + 500]
+                rows = self.conn.execute(
+                    "SELECT session_id, message FROM messages WHERE session_id IN ({}) ORDER BY session_id, seq".format(
+                        ",".join("?" * len(chunk))), chunk
+                ).fetchall()
+                for session_id, message in rows:
+                    result.setdefault(session_id, []).append(json.loads(message))
+        return result
+
+    def add(self, session_id: Optional[str] = None,
+            summary: str = None,
+            messages: List[Dict] = None,
+            mode: str = "cw") -> str:
+        """
+        Adding data to memory, same as JsonChatMessageMemory.add.
+
+        Parameter:
+            session_id: Optional[str] = None
+            summary: str = None, The summary of the message, used as the basis for retrieval, if None, it will be generated by the summarizer.
+            messages: List[Dict] = None
+            mode: str = "cw", Write mode, one of "w", "a" and "cw", see JsonChatMessageMemory.add.
+        """
+        if not messages:
+            return ""
+        if summary is None:
+            summary = self.summarizer.summarize(messages=messages)
+
+        with self._lock:
+            # If the summary already exists in memory, set the session_id to the session_id for the summary
+            is_exist = False
+            if session_id is None:
+                session_id = self._find_summary(summary)
+                is_exist = session_id is not None
+            # If the summary does not exist in memory, check if the session_id exists
+            if not is_exist and session_id is not None:
+                is_exist = self._has_session(session_id)
+
+            if is_exist and mode == "cw":
+                self.delete(session_id)
+                is_exist = False
+            elif is_exist and mode == "w":
+                return ""
+
+            if session_id is None:
+                session_id = str(uuid.uuid4()).replace("-", "")
+
+            self.version += 1
+            if not is_exist:
+                self.conn.execute("INSERT INTO sessions (session_id, summary, summary_hash) VALUES (?, ?, ?)",
+                                  (session_id, summary, self._hash(summary)))
+                summary_embedding = self.embedding.embed_query(summary)
+                if session_id in self.vectorstore:
+                    self.vectorstore.delete([session_id])
+                self.vectorstore.add_embeddings([session_id], [summary_embedding])
+            self._append_messages(session_id, messages)
+        return session_id
+
+    def similarity_search(
+            self, text: Union[str, Any], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
+    ) -> List[List[Dict]]:
+        return self.similarity_search_batch([text], k, score_threshold)[0]
+
+    def similarity_search_batch(
+            self, texts: List[str], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
+    ) -> List[List[List[Dict]]]:
+        """Search several texts at once, the messages of all the retrieved sessions are fetched with one query."""
+        if not texts:
+            return []
+        if len(texts) == 1:
+            embeddings = [self.embedding.embed_query(texts[0])]
+        else:
+            embeddings = self.embedding.embed_documents(texts)
+        results = self.vectorstore.similarity_search_batch(embeddings, k, score_threshold)
+        # Deduplicate while keeping the most similar first
+        session_ids = [list(dict.fromkeys(key for key, _ in key_and_score)) for key_and_score in results]
+        messages = self.get_many(list({i for ids in session_ids for i in ids}))
+        return [[messages.get(i, []) for i in ids] for ids in session_ids]
+
+    def delete(self, session_id: Optional[Union[List[str], str]] = None):
+        if isinstance(session_id, str):
+            session_id = [session_id]
+        with self._lock:
+            # If session_id is None, all session_ids are deleted.
+            if session_id is None:
+                session_id = [row[0] for row in self.conn.execute("SELECT session_id FROM sessions")]
+            self.version += 1
+            for i in range(0, len(session_id), 500):
+                chunk = session_id[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                self.conn.execute(f"DELETE FROM messages WHERE session_id IN ({placeholders})", chunk)
+                self.conn.execute(f"DELETE FROM sessions WHERE session_id IN ({placeholders})", chunk)
+            self.vectorstore.delete([i for i in session_id if i in self.vectorstore])
+
+    def get_all_memory(self) -> Dict[str, List[Dict]]:
+        with self._lock:
+            session_ids = [row[0] for row in self.conn.execute("SELECT session_id FROM sessions")]
+        messages = self.get_many(session_ids)
+        return {i: messages.get(i, []) for i in session_ids}
+
+    def save_memory(self, path: Union[str, Path], file_name: str):
+        if isinstance(path, str):
+            path = Path(path)
+        if not path.exists():
+            path.mkdir(parents=True)
+        db_path = path / f"{file_name}.sqlite"
+        with self._lock:
+            self.conn.commit()
+            if self.db_path != db_path:
+                # Copy the database to its new location and keep working on the copy
+                conn = self._connect(str(db_path))
+                self.conn.backup(conn)
+                self.conn.close()
+                self.conn, self.db_path = conn, db_path
+        self.vectorstore.save_vectorstore(path, file_name)
+
+    def load_memory(self, path: Union[str, Path], file_name: str, lazy: bool = True, warm_up: bool = False,
+                    **kwargs):
+        """Open the database of the memory, a memory saved by JsonChatMessageMemory is imported.
+        The messages are always read on demand, lazy and warm_up are accepted for compatibility with
+        JsonChatMessageMemory.load_memory, kwargs are passed to the load_vectorstore of the vectorstore."""
+        if isinstance(path, str):
+            path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"File {path} not found!.")
+        db_path = path / f"{file_name}.sqlite"
+        if not db_path.exists() and not (path / f"{file_name}.index.json").exists() and not (
+                path / f"{file_name}.json").exists():
+            raise FileNotFoundError(f"File {db_path} not found!.")
+
+        self.vectorstore = self.vectorstore.load_vectorstore(path, file_name, **kwargs)
+        with self._lock:
+            is_new = not db_path.exists()
+            self.conn.close()
+            self.conn, self.db_path = self._connect(str(db_path)), db_path
+            if is_new:
+                self._import_json_memory(path, file_name)
+            self.version += 1
+        return self
+
+    def _import_json_memory(self, path: Path, file_name: str):
+        json_memory, summary_dict = read_memory_file(path, file_name)
+        with self.conn:
+            self.conn.executemany("INSERT INTO sessions (session_id, summary, summary_hash) VALUES (?, ?, ?)",
+                                  [(i, s, self._hash(s)) for i, s in summary_dict.items()])
+            for session_id, messages in json_memory.items():
+                self._append_messages(session_id, messages)
+
+    def close(self):
+        """Close the database, the changes that were not saved are discarded."""
+        with self._lock:
+            self.conn.rollback()
+            self.conn.close()
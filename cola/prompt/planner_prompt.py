@@ -1,5 +1,5 @@
 from typing import Dict
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from config.config import Config
 from cola.utils.print_utils import any_to_str
 
@@ -11,6 +11,7 @@ class PlannerPrompt(BasePrompt):
         self.template_folder = config["root_path"] / "cola/prompt_templates/planner"
         self.agents_capability = agents_capability
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model) -> Dict[str, str]:
         system_template = self.load_template(self.template_folder / "system_template.txt")
 
@@ -42,6 +43,7 @@ class PlannerPrompt(BasePrompt):
 
         return self.create_user_prompt(content_list)
 
+    @cache_system_prompt
     def create_answer_system_prompt(self, format_model) -> Dict[str, str]:
         system_template = self.load_template(self.template_folder / "answer_template.txt")
 
@@ -1,5 +1,5 @@
 from typing import Dict
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from config.config import Config
 from cola.utils.print_utils import any_to_str
 from cola.tools.op import get_ops_function_dict
@@ -11,6 +11,7 @@ class ReviewerPrompt(BasePrompt):
     def __init__(self):
         self.template_folder = config["root_path"] / "cola/prompt_templates/reviewer"
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model) -> Dict[str, str]:
         system_template = self.load_template(self.template_folder / "system_template.txt")
 
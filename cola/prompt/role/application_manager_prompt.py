@@ -1,6 +1,5 @@
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from typing import Dict, List, Union
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from config.config import Config
 from cola.tools.op import get_ops_description
 from cola.utils.print_utils import any_to_str
@@ -8,7 +7,6 @@ from pywinauto.controls.uiawrapper import UIAWrapper
 
 
 config = Config.get_instance()
-wai = WindowsApplicationInspector()
 
 
 class ApplicationManagerPrompt(BasePrompt):
@@ -16,6 +14,7 @@ class ApplicationManagerPrompt(BasePrompt):
         super().__init__()
         self.template_folder = config["root_path"] / "cola/prompt_templates/role/application_manager"
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model, role) -> Dict[str, str]:
         system_prompt_template = self.load_template(self.template_folder / "system_template.txt")
         available_operation = get_ops_description(role=role)
@@ -29,7 +28,7 @@ class ApplicationManagerPrompt(BasePrompt):
         }
 
     def create_step_user_prompt(self, data) -> Dict[str, str]:
-        active_app_info_str = wai.get_active_application(refresh=True, return_str=True)
+        active_app_info_str = self.session.wai.get_active_application(refresh=True, return_str=True)
         content_list = []
 
         content_list.extend([
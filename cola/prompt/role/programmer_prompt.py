@@ -1,12 +1,10 @@
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from typing import Dict, List, Union
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from config.config import Config
 from cola.tools.op import get_ops_description
 from cola.utils.print_utils import any_to_str
 
 config = Config.get_instance()
-wai = WindowsApplicationInspector()
 
 
 class ProgrammerPrompt(BasePrompt):
@@ -14,6 +12,7 @@ class ProgrammerPrompt(BasePrompt):
         super().__init__()
         self.template_folder = config["root_path"] / "cola/prompt_templates/role/programmer"
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model, role) -> Dict[str, str]:
         system_prompt_template = self.load_template(self.template_folder / "system_template.txt")
         available_operation = get_ops_description(role=role)
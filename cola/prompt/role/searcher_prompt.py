@@ -1,22 +1,20 @@
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from typing import Dict, List, Union
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from config.config import Config
-from cola.tools.controller.screenshot import Photographer
 from cola.tools.op import get_ops_description
 from pywinauto.controls.uiawrapper import UIAWrapper
 from cola.utils.print_utils import any_to_str
 
 config = Config.get_instance()
-capturer = Photographer()
-wai = WindowsApplicationInspector()
 
 
 class SearcherPrompt(BasePrompt):
-    def __init__(self):
+    def __init__(self, stable_prefix: bool = False):
         super().__init__()
+        self.stable_prefix = stable_prefix  # see BaseRole.stable_prefix
         self.template_folder = config["root_path"] / "cola/prompt_templates/role/searcher"
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model, role) -> Dict[str, str]:
         system_prompt_template = self.load_template(self.template_folder / "system_template.txt")
         available_operation = get_ops_description(role=role)
@@ -31,26 +29,35 @@ class SearcherPrompt(BasePrompt):
 
     def create_step_user_prompt(self, data) -> Dict[str, Union[str, List]]:
         window = data.target_window
+        wai, capturer = self.session.wai, self.session.capturer
 
         ele_str = wai.get_application_elements(window, refresh=True, return_str=True)
         if config["draw_all_element_outlines"]:
             wai.draw_target_outlines(window, wai.app_elements_list, colour="green")
 
-        content_list = []
-        content_list.extend([
+        # One capture serves both images, the annotations are drawn on a copy
+        screenshot = capturer.take_application_screenshot(window)
+        window_contents = [
             "This is the current screenshot of the application window.",
-            capturer.take_application_screenshot(window),
+            screenshot,
             "This is the all controls in the application window: \n{}".format(ele_str),
             "And this is the annotation of the controls in the application window.",
-            capturer.take_application_screenshot_with_annotations(window, wai.app_elements_dict),
-        ])
-        content_list.extend([
+            capturer.take_application_screenshot_with_annotations(window, wai.app_elements_dict,
+                                                                  screenshot=screenshot.copy()),
+        ]
+        mission_contents = [
             "This is the overall mission: {}".format(data.task),
             "This is the question the mission needs to answer: {}".format(
                 data.question) if data.question else "This task does not need to be answered.",
             "Here are the subtasks you need to complete, [current subtasks]: {}".format(any_to_str(data.role_tasks)),
             "Make sure your next action is within [current subtasks], don't go ahead and do something that exceeds current subtasks based on the [current subtasks]."
-        ])
+        ]
+        content_list = []
+        if self.stable_prefix:
+            # The mission stays the same during the subtask, the window changes at every step
+            content_list.extend(mission_contents + window_contents)
+        else:
+            content_list.extend(window_contents + mission_contents)
 
         content_list.extend(self.catch(data, "feedback"))
         content_list.extend(self.catch(data, "result"))
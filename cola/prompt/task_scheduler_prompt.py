@@ -1,5 +1,5 @@
 from typing import List, Dict
-from cola.fundamental.base_prompt import BasePrompt
+from cola.fundamental.base_prompt import BasePrompt, cache_system_prompt
 from config.config import Config
 from cola.utils.print_utils import any_to_str
 
@@ -11,6 +11,7 @@ class TaskSchedulerPrompt(BasePrompt):
         self.template_folder = config["root_path"] / "cola/prompt_templates/task_scheduler"
         self.agents_capability = agents_capability
 
+    @cache_system_prompt
     def create_system_prompt(self, format_model) -> Dict[str, str]:
         system_template = self.load_template(self.template_folder / "system_template.txt")
 
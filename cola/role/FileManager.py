@@ -5,13 +5,9 @@ from cola.utils.agent_utils import RegisterAgent
 from cola.utils.data_utils import PrivateData
 from pydantic import BaseModel, Field
 from config.config import Config
-from cola.tools.controller.screenshot import Photographer
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from cola.prompt.role.file_manager_prompt import FileManagerPrompt
 
 config = Config.get_instance()
-wai = WindowsApplicationInspector()
-capturer = Photographer()
 
 _rf_params = dict(
     role=RoleType.FileManager,
@@ -82,14 +78,10 @@ class FileManager(BaseRole):
             if "role_tasks" in data:
                 self.cdc.summary_context[self.role].role_tasks = data.role_tasks
 
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(FileManagerResponseFormat, self.role),
-                *self.retrieve_long_term_memory(self.generate_summary())
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_step_user_prompt(data)
-            ]
+                lambda: self.prompter.create_step_user_prompt(data),
+            )
 
             origin_response, response = self.query(format_model=FileManagerResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
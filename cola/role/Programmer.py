@@ -5,16 +5,12 @@ from cola.utils.agent_utils import RegisterAgent
 from cola.utils.data_utils import PrivateData
 from pydantic import BaseModel, Field
 from config.config import Config
-from cola.tools.controller.screenshot import Photographer
-from cola.tools.controller.inspector import WindowsApplicationInspector
 from cola.prompt.role.programmer_prompt import ProgrammerPrompt
 from enum import Enum
 from cola.tools.op import OpType
 from pywinauto.controls.uiawrapper import UIAWrapper
 
 config = Config.get_instance()
-wai = WindowsApplicationInspector()
-capturer = Photographer()
 
 _rf_params = dict(
     role=RoleType.Programmer,
@@ -87,14 +83,10 @@ class Programmer(BaseRole):
             if "role_tasks" in data:
                 self.cdc.summary_context[self.role].role_tasks = data.role_tasks
 
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(ProgrammerResponseFormat, self.role),
-                *self.retrieve_long_term_memory(self.generate_summary())
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_step_user_prompt(data)
-            ]
+                lambda: self.prompter.create_step_user_prompt(data),
+            )
 
             origin_response, response = self.query(format_model=ProgrammerResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
@@ -103,7 +95,7 @@ class Programmer(BaseRole):
             origin_response, response = self.handoff_query()
 
         if response["answer"]:
-            self.cdc.role_context.role_infos.append(response["answer"])
+            self.cdc.add_role_info(response["answer"])
 
         # record execution steps
         self.record_session_step(step=dict(
@@ -6,13 +6,9 @@ from cola.utils.agent_utils import RegisterAgent
 from cola.utils.data_utils import PrivateData
 from pydantic import BaseModel, Field
 from config.config import Config
-from cola.tools.controller.inspector import WindowsApplicationInspector
-from cola.tools.controller.screenshot import Photographer
 from pywinauto.controls.uiawrapper import UIAWrapper
 
 config = Config.get_instance()
-wai = WindowsApplicationInspector()
-capturer = Photographer()
 
 _rf_params = dict(
     role=RoleType.Searcher,
@@ -48,7 +44,7 @@ class Searcher(BaseRole):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.prompter: SearcherPrompt = SearcherPrompt()
+        self.prompter: SearcherPrompt = SearcherPrompt(stable_prefix=self.stable_prefix)
         self.session_step = {
             "Execute Steps": [],
             "Experience": []
@@ -58,9 +54,9 @@ class Searcher(BaseRole):
         if (branch := response["branch"]) == "Continue":
             target_control = None
             if response["selected_control"]:
-                target_control = wai.app_elements_dict[response["selected_control"]]
+                target_control = self.session.wai.app_elements_dict[response["selected_control"]]
                 if config["draw_selected_element_outlines"]:
-                    wai.draw_target_outlines(target_control, [target_control], colour="red")
+                    self.session.wai.draw_target_outlines(target_control, [target_control], colour="red")
 
             return PrivateData(
                 sender=self.role, receiver=RoleType.Executor, event=WorkflowEvent.Executor_execute_op,
@@ -105,20 +101,16 @@ class Searcher(BaseRole):
 
         window: UIAWrapper = data.target_window
         if config["draw_window_outlines"]:
-            wai.draw_target_outlines(window, [window], colour="green")
+            self.session.wai.draw_target_outlines(window, [window], colour="green")
 
         if not handoff:
             if "role_tasks" in data:
                 self.cdc.summary_context[self.role].role_tasks = data.role_tasks
 
-            self.episodic_messages = [
+            self.build_step_messages(
                 self.prompter.create_system_prompt(SearcherResponseFormat, self.role),
-                *self.retrieve_long_term_memory(self.generate_summary())
-            ]
-            self.linked_messages = self.retrieve_short_term_memory()
-            self.query_messages = [
-                self.prompter.create_step_user_prompt(data)
-            ]
+                lambda: self.prompter.create_step_user_prompt(data),
+            )
 
             origin_response, response = self.query(format_model=SearcherResponseFormat)
             if origin_response is None and response is None and self.cdc.switch_to is not None:
@@ -127,7 +119,7 @@ class Searcher(BaseRole):
             origin_response, response = self.handoff_query()
 
         if response["information"]:
-            self.cdc.role_context.role_infos.append(response["information"])
+            self.cdc.add_role_info(response["information"])
 
         # record execution steps
         self.record_session_step(step=dict(
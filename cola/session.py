@@ -0,0 +1,126 @@
+"""Sessions own the instances that used to be process-wide: the ContextualDataCenter, the roles, the logger,
+the Photographer, the WindowsApplicationInspector and the configuration.
+
+Every singleton of the package is looked up in the current session, which is the default session unless
+another one is entered with use_session(). The default session is what the module-level code has always used,
+so a process that runs one session at a time does not need to know about sessions.
+
+Usage:
+    session = Session("task-1")
+    with use_session(session):
+        agents = init_roles()  # the roles, the contexts and the logs of task-1
+        Workflow(agents).step(data)
+"""
+from config.config import Config
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+import threading
+import abc
+
+
+class Session:
+    """
+    Parameter:
+        session_id: Optional[str], Id of the session, its logs are written into the folder of that name.
+            The id of the configuration by default
+        config: Optional[Config], Configuration of the session. By default the process configuration,
+            or a copy of it logging into the folder of session_id if session_id is another id
+    """
+
+    def __init__(self, session_id: Optional[str] = None, config: Optional[Config] = None):
+        if config is None:
+            config = Config.get_instance()
+            if session_id and session_id != config["session_id"]:
+                config = config.for_session(session_id)
+        self.config = config
+        self.session_id = self.config["session_id"]
+        self.instances: Dict[type, Any] = {}  # class: the only instance of the class in this session
+        self.agents_instance: Dict[str, Any] = {}  # Role Name: Role Instance, see RegisterAgent
+        self.agents_capability: Dict[str, str] = {}  # Role Name: Role Capabilities
+        self._lock = threading.RLock()
+
+    def get(self, cls: type, *args, **kwargs) -> Any:
+        """The instance of a Singleton class in this session, created with the arguments on first use."""
+        if cls not in self.instances:
+            with use_session(self):
+                return cls(*args, **kwargs)
+        return self.instances[cls]
+
+    @property
+    def cdc(self):
+        from cola.utils.data_utils import ContextualDataCenter
+        return self.get(ContextualDataCenter)
+
+    @property
+    def logger(self):
+        from logger.logger import ChatMessageLogger
+        return self.get(ChatMessageLogger)
+
+    @property
+    def capturer(self):
+        from cola.tools.controller.screenshot import Photographer
+        return self.get(Photographer)
+
+    @property
+    def wai(self):
+        from cola.tools.controller.inspector import WindowsApplicationInspector
+        return self.get(WindowsApplicationInspector)
+
+    @property
+    def settler(self):
+        from cola.tools.controller.settle import SettleDetector
+        return self.get(SettleDetector)
+
+    def __repr__(self):
+        return f"Session({self.session_id!r})"
+
+
+class Singleton(abc.ABCMeta, type):
+    """
+    Singleton metaclass for ensuring only one instance of a class per session.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        """Call method for the singleton metaclass."""
+        session = get_session()
+        instances = session.instances
+        if cls not in instances:
+            # Parallel branches may ask for the same instance at the same time
+            with session._lock:
+                if cls not in instances:
+                    instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+        return instances[cls]
+
+
+_default_session: Optional[Session] = None
+_default_lock = threading.Lock()
+# New threads start in the default session, a thread working for another session has to enter it
+_current_session: ContextVar[Optional[Session]] = ContextVar("cola_session", default=None)
+
+
+def get_default_session() -> Session:
+    global _default_session
+    if _default_session is None:
+        with _default_lock:
+            if _default_session is None:
+                _default_session = Session()
+    return _default_session
+
+
+def get_session() -> Session:
+    """The session of the current thread or task, the default session outside use_session()."""
+    return _current_session.get() or get_default_session()
+
+
+@contextmanager
+def use_session(session: Optional[Session]) -> Iterator[Session]:
+    """Make the session the current one in this block, None keeps the current session."""
+    if session is None:
+        yield get_session()
+        return
+    token = _current_session.set(session)
+    try:
+        yield session
+    finally:
+        _current_session.reset(token)
@@ -1,2 +1,3 @@
 from .screenshot import Photographer
 from .inspector import WindowsApplicationInspector
+from .settle import SettleDetector, set_focus_and_wait
@@ -5,6 +5,7 @@ from typing import Dict, List, Tuple, Union
 from abc import ABC, abstractmethod
 import psutil
 from config.config import Config
+from cola.session import Singleton
 import time
 
 config = Config.get_instance()
@@ -226,14 +227,7 @@ class Win32BackendStrategy(BackendStrategy):
         ]
 
 
-class WindowsApplicationInspector:
-    _instance = None
-
-    def __new__(cls, backend: str = config["backend"]):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
+class WindowsApplicationInspector(metaclass=Singleton):
     def __init__(self, backend: str = config["backend"]):
         self.backend_method = BackendFactory.create_backend(backend)
 
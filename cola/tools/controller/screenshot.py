@@ -5,18 +5,12 @@ from typing import Dict, List, Tuple
 from pathlib import Path
 import time
 from config.config import Config
+from cola.session import Singleton
 
 config = Config.get_instance()
 
 
-class Photographer:
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
+class Photographer(metaclass=Singleton):
     def __init__(self):
         pass
 
@@ -0,0 +1,122 @@
+from PIL import Image, ImageGrab
+from pywinauto.controls.uiawrapper import UIAWrapper
+from typing import Optional, Tuple
+import hashlib
+import time
+import psutil
+from cola.session import Singleton, get_session
+
+
+class SettleDetector(metaclass=Singleton):
+    """Wait until the screen stops changing, instead of pausing for a fixed time after an operation.
+
+    The screen is considered settled when a downscaled screenshot of the desktop, the title and the number
+    of children of the target window stay the same for stable_time seconds, and the process of the target
+    window is not busy. The wait always ends after timeout seconds.
+
+    Parameter (None takes the value of settle_detection in config.yaml):
+        enable: bool, If False, wait always sleeps for the whole timeout
+        stable_time: float, Seconds the signals must stay unchanged
+        timeout: float, The longest wait in seconds
+        poll_interval: float, Seconds between two polls
+        thumbnail_size: int, Side of the screenshot thumbnail that is hashed
+        cpu_threshold: float, CPU percent of the target process above which it is considered busy
+    """
+
+    def __init__(self, enable: Optional[bool] = None, stable_time: Optional[float] = None,
+                 timeout: Optional[float] = None, poll_interval: Optional[float] = None,
+                 thumbnail_size: Optional[int] = None, cpu_threshold: Optional[float] = None):
+        # The arguments that are given win over settle_detection in config.yaml, which wins over the defaults
+        settings = dict(enable=True, stable_time=0.8, timeout=5, poll_interval=0.2, thumbnail_size=64, cpu_threshold=10)
+        settings.update(get_session().config["settle_detection"] or {})
+        arguments = dict(enable=enable, stable_time=stable_time, timeout=timeout, poll_interval=poll_interval,
+                         thumbnail_size=thumbnail_size, cpu_threshold=cpu_threshold)
+        settings.update({key: value for key, value in arguments.items() if value is not None})
+        self.enable = settings["enable"]
+        self.stable_time = settings["stable_time"]
+        self.timeout = settings["timeout"]
+        self.poll_interval = settings["poll_interval"]
+        self.thumbnail_size = settings["thumbnail_size"]
+        self.cpu_threshold = settings["cpu_threshold"]
+
+    def _screen_hash(self) -> str:
+        thumbnail = ImageGrab.grab().convert("L").resize((self.thumbnail_size, self.thumbnail_size),
+                                                         Image.BILINEAR)
+        # Drop the low bits so that blinking cursors and antialiasing noise do not count as changes
+        return hashlib.md5(thumbnail.point(lambda p: p >> 3).tobytes()).hexdigest()
+
+    @staticmethod
+    def _window_state(window: Optional[UIAWrapper]) -> Tuple:
+        if window is None:
+            return ()
+        try:
+            return window.window_text(), len(window.children())
+        except Exception:
+            # The operation may close the window
+            return ()
+
+    @staticmethod
+    def _process(window: Optional[UIAWrapper]) -> Optional[psutil.Process]:
+        if window is None:
+            return None
+        try:
+            process = psutil.Process(window.process_id())
+            process.cpu_percent(None)  # The first call only starts the measurement
+            return process
+        except Exception:
+            return None
+
+    def _is_busy(self, process: Optional[psutil.Process]) -> bool:
+        if process is None:
+            return False
+        try:
+            return process.cpu_percent(None) > self.cpu_threshold
+        except psutil.Error:
+            return False
+
+    def wait(self, window: Optional[UIAWrapper] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the screen is settled or the timeout is reached.
+
+        Parameter:
+            window: Optional[UIAWrapper], The window the operation was performed on
+            timeout: Optional[float], The longest wait in seconds, defaults to the configured timeout
+        Return:
+            bool, True if the screen settled, False if the wait timed out
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not self.enable:
+            time.sleep(timeout)
+            return False
+
+        start = time.perf_counter()
+        deadline = start + timeout
+        process = self._process(window)
+        signature = None
+        stable_since = start
+        while True:
+            now = time.perf_counter()
+            current = (self._screen_hash(), self._window_state(window))
+            if current != signature or self._is_busy(process):
+                signature, stable_since = current, now
+            elif now - stable_since >= self.stable_time:
+                return True
+            if now >= deadline:
+                return False
+            time.sleep(min(self.poll_interval, max(deadline - now, 0)))
+
+
+def set_focus_and_wait(wrapper: UIAWrapper, timeout: float = 0.5, poll_interval: float = 0.05) -> bool:
+    """Set the focus on a window or control and return as soon as it has it, at the latest after timeout seconds."""
+    wrapper.set_focus()
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            # Controls that cannot take the keyboard focus are ready once their window is in the foreground
+            if wrapper.has_keyboard_focus() if wrapper.is_keyboard_focusable() else wrapper.is_active():
+                return True
+        except Exception:
+            pass
+        if time.perf_counter() >= deadline:
+            return False
+        time.sleep(poll_interval)
@@ -1,13 +1,23 @@
 from cola.fundamental.base_embedding import BaseEmbedding
-from typing import List
-from openai import OpenAI
+from cola.tools.embedding.SqliteEmbeddingCache import SqliteEmbeddingCache
+from typing import List, Optional, Dict
+from cola.utils.client_utils import get_openai_client
 from functools import partial
 
+# Output dimensions of the supported models, so that no request is needed to know them
+EMBEDDING_DIMS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+}
+
 
 class OpenAIEmbedding(BaseEmbedding):
     def __init__(self, openai_api_key: str,
                  openai_api_base: str = None,
                  model: str = "text-embedding-3-large",
+                 cache: Optional[SqliteEmbeddingCache] = None,
+                 batch_size: int = 512,
                  **kwargs):
         assert model in ["text-embedding-ada-002", "text-embedding-3-large", "text-embedding-3-small"], \
             "embedding model must be one of ['text-embedding-ada-002', 'text-embedding-3-large', 'text-embedding-3-small']"
@@ -16,22 +26,47 @@ class OpenAIEmbedding(BaseEmbedding):
         if self.dimensions is not None:
             assert model in ["text-embedding-3-large", "text-embedding-3-small"], \
                 "dimensions can only be specified for text-embedding-3 models"
+        self.cache = cache
+        self._probed_dim: Optional[int] = None
+        # The embeddings API accepts at most 2048 inputs per request
+        self.batch_size = min(batch_size, 2048)
 
-        self.client = OpenAI(api_key=openai_api_key, base_url=openai_api_base)
+        self.client = get_openai_client(openai_api_key, openai_api_base)
         self.embedding = partial(self.client.embeddings.create, model=model, **kwargs)
 
     def embed_query(self, text: str) -> List[float]:
-        text = text.replace("\n", " ")
-        return self.embedding(input=[text]).data[0].embedding
+        return self.embed_documents([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = [text.replace("\n", " ") for text in texts]
+
+        embeddings: Dict[str, List[float]] = {}
+        keys = {}
+        if self.cache is not None:
+            keys = {text: self.cache.make_key(self.model, self.dimensions, text) for text in texts}
+            cached = self.cache.get_many(set(keys.values()))
+            embeddings = {text: cached[key] for text, key in keys.items() if key in cached}
+
+        # Only request the texts that are not cached, each distinct text once
+        missing = [text for text in dict.fromkeys(texts) if text not in embeddings]
+        new_embeddings = {}
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            data = sorted(self.embedding(input=batch).data, key=lambda d: d.index)
+            new_embeddings.update({text: d.embedding for text, d in zip(batch, data)})
+
+        if self.cache is not None:
+            self.cache.set_many({keys[text]: v for text, v in new_embeddings.items()})
+        embeddings.update(new_embeddings)
+        return [embeddings[text] for text in texts]
 
     def get_embedding_dim(self) -> int:
-        if self.model == "text-embedding-ada-002":
-            return 1536
         # If there is a dimension specified, it is returned directly, only valid for embedding-3
         if self.dimensions is not None:
             return self.dimensions
-        if self.model == "text-embedding-3-large":
-            return 3072
-        if self.model == "text-embedding-3-small":
-            return 1536
-        return len(self.embed_query("test dimensions"))
+        if self.model in EMBEDDING_DIMS:
+            return EMBEDDING_DIMS[self.model]
+        # Unknown model, probe it once. The probe goes through the embedding cache, so it is only sent once per cache file
+        if self._probed_dim is None:
+            self._probed_dim = len(self.embed_query("test dimensions"))
+        return self._probed_dim
@@ -0,0 +1,68 @@
+from typing import List, Dict, Optional, Union, Iterable
+from pathlib import Path
+from config.config import Config
+import numpy as np
+import threading
+import hashlib
+import sqlite3
+
+config = Config.get_instance()
+
+
+class SqliteEmbeddingCache:
+    """Persistent embedding cache keyed by a hash of (model, dimensions, text), vectors are stored as float32 blobs."""
+
+    def __init__(self, db_path: Union[str, Path]):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{dimensions}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(keys)
+        result = {}
+        with self._lock:
+            # Stay below the sqlite limit of host parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN ({})".format(",".join("?" * len(chunk))), chunk
+                ).fetchall()
+                for key, vector in rows:
+                    result[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return result
+
+    def set_many(self, embeddings: Dict[str, List[float]]) -> None:
+        if not embeddings:
+            return
+        rows = [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in embeddings.items()]
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+_default_cache: Optional[SqliteEmbeddingCache] = None
+
+
+def get_default_embedding_cache() -> Optional[SqliteEmbeddingCache]:
+    """Get the embedding cache configured in config.yaml, None if it is disabled."""
+    global _default_cache
+    if not config["embedding_cache"]["enable"]:
+        return None
+    if _default_cache is None:
+        _default_cache = SqliteEmbeddingCache(config["root_path"] / config["embedding_cache"]["cache_path"])
+    return _default_cache
@@ -0,0 +1,95 @@
+from typing import Any, Optional, Union
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import json
+import os
+
+
+class DiskResponseCache:
+    """Content-addressed LM response store, one json file per key, evicted in LRU order.
+
+    Parameter:
+        cache_folder: Union[str, Path], Folder where the responses are stored
+        max_entries: int, Maximum number of cached responses
+        max_size_mb: float, Maximum total size of the cached responses on disk
+    """
+
+    def __init__(self, cache_folder: Union[str, Path],
+                 max_entries: int = 10000,
+                 max_size_mb: float = 1024):
+        self.cache_folder = Path(cache_folder)
+        self.cache_folder.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_size = int(max_size_mb * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()  # key: file size, oldest first
+        self._size = 0
+        # Rebuild the LRU order from the access time recorded in the file mtime
+        for path in sorted(self.cache_folder.glob("*/*.json"), key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._size += size
+        self._evict()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_folder / key[:2] / f"{key}.json"
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    value = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                # The file was removed or corrupted outside the cache, forget it
+                self._size -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+            os.utime(path)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        content = json.dumps(value, ensure_ascii=False)
+        path = self._path(key)
+        # The file and the size accounting change together, so that a concurrent eviction never sees one without the other
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+            self._size -= self._entries.pop(key, 0)
+            size = path.stat().st_size
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)
+                self._path(key).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._entries:
+                self._path(key).unlink(missing_ok=True)
+            self._entries.clear()
+            self._size = 0
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_size):
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._path(key).unlink(missing_ok=True)
@@ -1,5 +1,5 @@
 from .ops import *
-from .op_utils import role_op, role_op_model, op_model_map, op_func_map, verify_op_params, get_ops_description, get_ops_function_dict
+from .op_utils import role_op, role_op_model, op_model_map, op_func_map, verify_op_params, get_ops_description, get_ops_function_dict, invalidate_ops_cache
 from typing import Union, Type
 from pydantic import BaseModel, Field, model_validator, field_validator, create_model
 
@@ -8,6 +8,7 @@ from copy import deepcopy
 from pydantic import BaseModel
 from cola.utils.print_utils import format_pydantic_model
 from cola.utils.datatype import RoleType
+from cola.utils.cache_utils import bump_prompt_cache_version
 
 config = Config.get_instance()
 
@@ -15,6 +16,15 @@ role_op: Dict[RoleType, Dict] = {}
 role_op_model: Dict[RoleType, List] = {}
 op_model_map: Dict[str, Type[BaseModel]] = {}
 op_func_map: Dict[str, Callable] = {}
+# Descriptions of the registered operations, cleared whenever an operation is registered
+_ops_description_cache: Dict = {}
+
+
+def invalidate_ops_cache():
+    """Clear the cached operation descriptions and the system prompts built from them,
+    call it after changing role_op or op_func_map by hand."""
+    _ops_description_cache.clear()
+    bump_prompt_cache_version()
 
 
 def verify_op_params(func_name: str,
@@ -65,10 +75,15 @@ def get_ops_description(role: RoleType = None, operations: Dict = None) -> str:
     Return:
         str -- The description of the operations
     """
-    if operations is None:
+    if operations is not None:
+        return _describe_ops(operations)
+    if ("description", role) not in _ops_description_cache:
         global role_op
-        operations = role_op[role]
+        _ops_description_cache[("description", role)] = _describe_ops(role_op[role])
+    return _ops_description_cache[("description", role)]
 
+
+def _describe_ops(operations: Dict) -> str:
     func_desc = []
     for func_name, func in operations.items():
         func_desc.append("- {} :".format(func.__name__) + "\n" + func.__doc__)
@@ -77,10 +92,15 @@ def get_ops_description(role: RoleType = None, operations: Dict = None) -> str:
 
 def get_ops_function_dict(operations: Dict = None) -> Dict:
     """Get the function of the operations"""
-    if operations is None:
+    if operations is not None:
+        return _ops_functions(operations)
+    if "functions" not in _ops_description_cache:
         global op_func_map
-        operations = op_func_map
+        _ops_description_cache["functions"] = _ops_functions(op_func_map)
+    return dict(_ops_description_cache["functions"])
+
 
+def _ops_functions(operations: Dict) -> Dict:
     func_desc = {}
     for func_name, func in operations.items():
         op_function = func.__doc__.split("\n")[0]
@@ -147,4 +167,5 @@ class OperationRegister:
 
         op_func_map[wrapper.__name__] = wrapper
         op_model_map[wrapper.__name__] = self.model
+        invalidate_ops_cache()
         return wrapper
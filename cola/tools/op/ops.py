@@ -5,7 +5,8 @@ import time
 from cola.utils.datatype import RoleType
 from cola.tools.op.special_operations import op_open_application
 from typing import Any, Optional, List, Callable, Union, Dict
-from cola.tools.controller.inspector import WindowsApplicationInspector
+from cola.tools.controller.settle import set_focus_and_wait
+from cola.session import get_session
 from config.config import Config
 import pyautogui
 import pandas as pd
@@ -14,7 +15,6 @@ import json
 from docx import Document
 from PIL import Image, ImageOps
 
-wai = WindowsApplicationInspector()
 config = Config.get_instance()
 
 
@@ -43,8 +43,7 @@ Examples:
     1. {"func_name": "click_input", "params": {"button": "left", "double": True}}: This command will simulate double-click the left button.
     2. {"func_name": "click_input", "params": {"button": "right", "double": False}}: This command will simulate single-click the right button .
     """
-    control.set_focus()
-    time.sleep(0.5)
+    set_focus_and_wait(control)
     control.click_input(button=button, double=double)
     return None
 
@@ -80,8 +79,7 @@ Notice:
 Examples:
     1. {"func_name": "keyboard_input", "params": {"keys": "hello world", "clear": True}}: This command will clear existing text, then input the text "hello world".
     """
-    control.set_focus()
-    time.sleep(0.5)
+    set_focus_and_wait(control)
     if str(clear).lower() == "true":
         control.type_keys("{VK_CONTROL down}{a down}{a up}{VK_CONTROL up}{BACKSPACE}", pause=0.1)
         time.sleep(0.3)
@@ -130,11 +128,10 @@ Examples:
             raise ValueError(f"Invalid key: {k}. Expected one of {', '.join(pyautogui.KEY_NAMES)}")
 
     if window and isinstance(window, UIAWrapper):
-        window.set_focus()
+        set_focus_and_wait(window)
     if control and isinstance(control, UIAWrapper):
-        control.set_focus()
+        set_focus_and_wait(control)
 
-    time.sleep(0.5)
     if len(keys) == 1:
         pyautogui.press(keys[0])
     else:
@@ -172,11 +169,9 @@ Examples:
     2. {"func_name": "scroll", "params": {"wheel_dist": -1}}: This command will scroll the control item downward by one unit.
     """
     if window and isinstance(window, UIAWrapper):
-        window.set_focus()
-        time.sleep(0.5)
+        set_focus_and_wait(window)
     if control and isinstance(control, UIAWrapper):
-        control.set_focus()
-    time.sleep(0.5)
+        set_focus_and_wait(control)
     pyautogui.scroll(wheel_dist * 120)
     return None
 
@@ -197,11 +192,11 @@ def wait_for_loading(window: UIAWrapper, control: UIAWrapper, seconds: int = 3)
 Parameter:
 [Parameter]
 Notice:
-    This function works with all type of controls.
+    This function works with all type of controls. It returns early once the window stops changing.
 Examples:
-    1. {"func_name": "wait_for_loading", "params": {"seconds": 3}}: This operation will wait for 3 seconds.
+    1. {"func_name": "wait_for_loading", "params": {"seconds": 3}}: This operation will wait for 3 seconds at most.
     """
-    time.sleep(seconds)
+    get_session().settler.wait(window, timeout=seconds)
     return None
 
 
@@ -230,6 +225,7 @@ Examples:
     1. {"func_name": "open_application", "params": {"app_name": "Edge"}}: This command will open the Microsoft Edge application.
     2. {"func_name": "open_application", "params": {"app_label": "1"}}: This command will open the application with label 1.
     """
+    wai = get_session().wai
     if app_label:
         window = wai.active_apps_dict[app_label]
     else:
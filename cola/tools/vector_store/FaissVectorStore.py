@@ -1,10 +1,13 @@
 from typing import Any, Optional, List, Union, Dict, Tuple
 import os
 from cola.fundamental.base_vectorstore import BaseVectorStore
+from cola.utils.print_utils import print_with_color
 from pathlib import Path
 import numpy as np
 import operator
 import pickle
+import json
+import uuid
 
 
 def dependable_faiss_import(no_avx2: Optional[bool] = None) -> Any:
@@ -34,17 +37,175 @@ def dependable_faiss_import(no_avx2: Optional[bool] = None) -> Any:
     return faiss
 
 
+INDEX_TYPES = ["flat", "hnsw", "ivf_flat", "ivf_pq"]
+METRICS = ["ip", "cosine", "l2"]
+# Index parameters that change how the vectors are stored, a loaded store is rebuilt when they differ
+STRUCTURAL_PARAMS = ["index_type", "metric", "float16", "nlist", "hnsw_m", "ef_construction", "pq_m", "pq_nbits"]
+
+
 class FaissVectorStore(BaseVectorStore):
+    """Vector store based on faiss.
+
+    Vectors are stored under stable 64-bit ids and a bidirectional key <-> id map is kept,
+    so that membership tests are O(1) and deletes never renumber the remaining vectors.
+
+    Parameter:
+        embedding_dim: int, Dimension of the embeddings
+        metric: str, one of "ip" (inner product), "cosine" (inner product of vectors normalized at insert and query time)
+            and "l2" (squared euclidean distance). score_threshold keeps scores above it for "ip" and "cosine",
+            and distances below it for "l2".
+        float16: bool, Store the vectors as float16 to halve memory, ignored by "ivf_pq" which already compresses them
+        index_type: str, one of "flat" (exhaustive search), "hnsw", "ivf_flat" and "ivf_pq".
+            The ivf indexes search exhaustively until train_threshold vectors exist, then they are trained automatically.
+        nlist: int, Number of ivf clusters
+        nprobe: int, Number of ivf clusters visited per search
+        hnsw_m: int, Number of neighbors per hnsw node
+        ef_construction: int, hnsw search depth when adding vectors
+        ef_search: int, hnsw search depth when searching
+        pq_m: int, Number of pq sub-quantizers, must divide embedding_dim
+        pq_nbits: int, Bits per pq sub-quantizer code
+        train_threshold: Optional[int], Number of vectors needed to train the ivf indexes, 39 * nlist by default
+        compact_threshold: int, Number of journal operations after which save_vectorstore writes a full snapshot again
+
+    On disk a store is a snapshot ({file_name}.faiss and {file_name}.pkl) plus an append-only key journal
+    ({file_name}.journal) whose vectors are appended to {file_name}.vec. save_vectorstore only appends the
+    changes since the last save, and compacts the journal into a new snapshot once it grows past compact_threshold.
+    """
+
     def __init__(self, embedding_dim: int,
                  index: Optional[Any] = None,
-                 index_to_key: Optional[Dict[int, str]] = None):
-        faiss = dependable_faiss_import()
+                 index_to_key: Optional[Dict[int, str]] = None,
+                 next_id: Optional[int] = None,
+                 index_type: str = "flat",
+                 metric: str = "ip",
+                 float16: bool = False,
+                 nlist: int = 100,
+                 nprobe: int = 8,
+                 hnsw_m: int = 32,
+                 ef_construction: int = 40,
+                 ef_search: int = 64,
+                 pq_m: int = 16,
+                 pq_nbits: int = 8,
+                 train_threshold: Optional[int] = None,
+                 compact_threshold: int = 1000):
+        assert index_type in INDEX_TYPES, f"index_type must be one of {INDEX_TYPES}, but got {index_type}"
+        assert metric in METRICS, f"metric must be one of {METRICS}, but got {metric}"
+        if index_type == "ivf_pq":
+            assert embedding_dim % pq_m == 0, f"pq_m: {pq_m} must divide embedding_dim: {embedding_dim}"
         self.embedding_dim = embedding_dim
-        self.index = faiss.IndexFlatIP(embedding_dim) if index is None else index
+        self.index_params = dict(
+            index_type=index_type, metric=metric, float16=float16, nlist=nlist, nprobe=nprobe, hnsw_m=hnsw_m,
+            ef_construction=ef_construction, ef_search=ef_search, pq_m=pq_m, pq_nbits=pq_nbits,
+            train_threshold=39 * nlist if train_threshold is None else train_threshold,
+        )
+
+        self.index = self._create_index() if index is None else index
         self.index_to_key = {} if index_to_key is None else index_to_key
+        self.key_to_index = {key: i for i, key in self.index_to_key.items()}
+        # ids are never reused, so that a stale id can not point to another key
+        self.next_id = max(self.index_to_key, default=-1) + 1 if next_id is None else next_id
+        # ids deleted from the hnsw graph, which does not support removal, they are filtered out of the results
+        self._tombstones = set()
+        self.set_search_params()
+
+        self.compact_threshold = compact_threshold
+        # ("add", ids, keys) and ("delete", ids) operations since the last save
+        self._pending_ops: List[Tuple] = []
+        # Snapshot the journal belongs to, as (path, file_name, generation), and number of operations in the journal
+        self._persist_target: Optional[Tuple[str, str, str]] = None
+        self._journal_len = 0
+        # Snapshot whose inverted lists are memory-mapped by the index, it is read into memory before the first change
+        self._mapped_path: Optional[Path] = None
+
+    def _faiss_metric(self) -> int:
+        faiss = dependable_faiss_import()
+        return faiss.METRIC_L2 if self.index_params["metric"] == "l2" else faiss.METRIC_INNER_PRODUCT
+
+    def _prepare(self, embeddings: Any) -> np.ndarray:
+        """Convert the embeddings to a float32 matrix, normalized for the cosine metric."""
+        vectors = np.array(embeddings, dtype=np.float32)
+        if self.index_params["metric"] == "cosine":
+            norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors
+
+    def _create_index(self) -> Any:
+        faiss = dependable_faiss_import()
+        metric = self._faiss_metric()
+        if self.index_params["index_type"] == "hnsw":
+            if self.index_params["float16"]:
+                base = faiss.IndexHNSWSQ(self.embedding_dim, faiss.ScalarQuantizer.QT_fp16,
+                                         self.index_params["hnsw_m"], metric)
+            else:
+                base = faiss.IndexHNSWFlat(self.embedding_dim, self.index_params["hnsw_m"], metric)
+            base.hnsw.efConstruction = self.index_params["ef_construction"]
+        elif self.index_params["float16"] and self.index_params["index_type"] != "ivf_pq":
+            base = faiss.IndexScalarQuantizer(self.embedding_dim, faiss.ScalarQuantizer.QT_fp16, metric)
+        else:
+            # The ivf indexes start with exhaustive search until enough vectors exist to train them
+            base = faiss.IndexFlat(self.embedding_dim, metric)
+        return faiss.IndexIDMap2(base)
+
+    def _create_ivf_index(self) -> Any:
+        faiss = dependable_faiss_import()
+        metric = self._faiss_metric()
+        quantizer = faiss.IndexFlat(self.embedding_dim, metric)
+        if self.index_params["index_type"] == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, self.embedding_dim, self.index_params["nlist"],
+                                     self.index_params["pq_m"], self.index_params["pq_nbits"], metric)
+        elif self.index_params["float16"]:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, self.embedding_dim, self.index_params["nlist"],
+                                                  faiss.ScalarQuantizer.QT_fp16, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, self.embedding_dim, self.index_params["nlist"], metric)
+        # The ivf index keeps the ids itself, a hashtable direct map allows removal and reconstruction by id
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    def is_trained_ivf(self) -> bool:
+        faiss = dependable_faiss_import()
+        return isinstance(self.index, faiss.IndexIVF)
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+        """Tune the recall/latency trade-off of the approximate indexes."""
+        faiss = dependable_faiss_import()
+        if nprobe is not None:
+            self.index_params["nprobe"] = nprobe
+        if ef_search is not None:
+            self.index_params["ef_search"] = ef_search
+
+        if self.is_trained_ivf():
+            self.index.nprobe = self.index_params["nprobe"]
+        elif self.index_params["index_type"] == "hnsw":
+            faiss.downcast_index(self.index.index).hnsw.efSearch = self.index_params["ef_search"]
+
+    def _reconstruct(self, ids: List[int]) -> np.ndarray:
+        if len(ids) == 0:
+            return np.zeros((0, self.embedding_dim), dtype=np.float32)
+        return np.vstack([self.index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+
+    def _rebuild(self, index: Any) -> None:
+        """Move all live vectors into the given empty index."""
+        ids = list(self.index_to_key)
+        vectors = self._reconstruct(ids)
+        if not index.is_trained:
+            index.train(vectors)
+        if len(ids) > 0:
+            index.add_with_ids(vectors, np.array(ids, dtype=np.int64))
+        self.index = index
+        self._tombstones = set()
+        self.set_search_params()
+
+    def _maybe_train(self) -> None:
+        if (self.index_params["index_type"] in ["ivf_flat", "ivf_pq"] and not self.is_trained_ivf() and
+                len(self.index_to_key) >= self.index_params["train_threshold"]):
+            self._rebuild(self._create_ivf_index())
 
     def __contains__(self, item: str) -> bool:
-        return item in self.index_to_key.values()
+        return item in self.key_to_index
+
+    def __len__(self) -> int:
+        return len(self.key_to_index)
 
     def add_embeddings(
             self,
@@ -52,74 +213,296 @@ class FaissVectorStore(BaseVectorStore):
             embeddings: List[List[float]] = None,
             **kwargs: Any,
     ) -> None:
+        """Add embeddings, the embedding of a key that already exists is overwritten."""
         assert len(keys) == len(
             embeddings
         ), f"keys: {len(keys)}, embeddings: {len(embeddings)} expected to be equal length"
+        if len(keys) == 0:
+            return
+
+        # Keep the last embedding of the keys that are repeated in this call
+        positions = sorted({key: j for j, key in enumerate(keys)}.values())
+        keys = [keys[j] for j in positions]
+        vector = self._prepare(embeddings)[positions]
 
-        vector = np.array(embeddings, dtype=np.float32)
-        self.index.add(vector)
+        existing_keys = [key for key in keys if key in self.key_to_index]
+        if existing_keys:
+            self.delete(existing_keys)
 
-        starting_len = len(self.index_to_key)
-        index_to_key = {starting_len + j: id_ for j, id_ in enumerate(keys)}
-        self.index_to_key.update(index_to_key)
+        ids = list(range(self.next_id, self.next_id + len(keys)))
+        self._add_ids(ids, keys, vector)
+        self._pending_ops.append(("add", ids, keys))
+
+    def _ensure_writable(self) -> None:
+        if self._mapped_path is not None:
+            # The index still matches the snapshot, every change goes through here first
+            faiss = dependable_faiss_import()
+            ntotal = self.index.ntotal
+            self.index = faiss.read_index(str(self._mapped_path))
+            assert self.index.ntotal == ntotal, f"{self._mapped_path} changed since it was memory-mapped"
+            self._mapped_path = None
+            self.set_search_params()
+
+    def _add_ids(self, ids: List[int], keys: List[str], vectors: np.ndarray) -> None:
+        self._ensure_writable()
+        self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), np.array(ids, dtype=np.int64))
+        for id_, key in zip(ids, keys):
+            self.index_to_key[id_] = key
+            self.key_to_index[key] = id_
+        self.next_id = max(self.next_id, max(ids) + 1)
+
+        self._maybe_train()
+
+    def _remove_ids(self, ids_to_delete: List[int]) -> None:
+        self._ensure_writable()
+        for id_ in ids_to_delete:
+            del self.key_to_index[self.index_to_key.pop(id_)]
+
+        if self.index_params["index_type"] == "hnsw":
+            # The hnsw graph does not support removal, compact it once the deleted vectors pile up
+            self._tombstones.update(ids_to_delete)
+            if len(self._tombstones) > max(len(self.index_to_key), 1000) // 4:
+                self._rebuild(self._create_index())
+        else:
+            self.index.remove_ids(np.array(ids_to_delete, dtype=np.int64))
 
     def delete(self, keys: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
         # if keys is None, delete all
         if keys is None:
-            keys = list(self.index_to_key.values())
+            keys = list(self.key_to_index)
 
-        missing_keys = set(keys).difference(self.index_to_key.values())
+        keys = set(keys)
+        missing_keys = keys.difference(self.key_to_index)
         if missing_keys:
             raise ValueError(
                 f"Some specified ids do not exist in the current store. Ids not found: "
                 f"{missing_keys}"
             )
 
-        reversed_index = {id_: idx for idx, id_ in self.index_to_key.items()}
-        index_to_delete = {reversed_index[id_] for id_ in keys}
-
-        self.index.remove_ids(np.fromiter(index_to_delete, dtype=np.int64))
-        remaining_ids = [
-            id_
-            for i, id_ in sorted(self.index_to_key.items())
-            if i not in index_to_delete
-        ]
-        self.index_to_key = {i: id_ for i, id_ in enumerate(remaining_ids)}
+        ids_to_delete = [self.key_to_index[key] for key in keys]
+        if ids_to_delete:
+            self._remove_ids(ids_to_delete)
+            self._pending_ops.append(("delete", ids_to_delete))
 
         return True
 
     def similarity_search(
             self, embedding: List[float], k: int = 4, score_threshold: Optional[float] = None, **kwargs: Any
     ) -> List[Tuple[str, float]]:
-        if len(self.index_to_key) == 0:
-            return []
-        vector = np.array([embedding], dtype=np.float32)
-        scores, indices = self.index.search(vector, min(k, len(self.index_to_key)))
+        return self.similarity_search_batch([embedding], k, score_threshold)[0]
 
-        key_and_score = [(self.index_to_key[i], score) for i, score in zip(indices[0], scores[0])]
+    def similarity_search_batch(
+            self, embeddings: Union[List[List[float]], np.ndarray], k: int = 4, score_threshold: Optional[float] = None,
+            **kwargs: Any
+    ) -> List[List[Tuple[str, float]]]:
+        """Search all the queries with a single index search, the results are in the order of the queries."""
+        if len(embeddings) == 0:
+            return []
+        if len(self.index_to_key) == 0:
+            return [[] for _ in range(len(embeddings))]
+        vectors = self._prepare(embeddings)
+        scores, indices = self.index.search(vectors, min(k + len(self._tombstones), self.index.ntotal))
 
-        if score_threshold is not None:
-            # TODO: support different distance metrics
-            cmp = operator.gt
-            key_and_score = [(key, score) for key, score in key_and_score if cmp(score, score_threshold)]
-        return key_and_score[:k]
+        # The l2 scores are distances, lower is closer
+        cmp = operator.lt if self.index_params["metric"] == "l2" else operator.gt
+        results = []
+        for row_indices, row_scores in zip(indices, scores):
+            # faiss pads the result with the id -1 when fewer than k vectors are found
+            key_and_score = [(self.index_to_key[i], score) for i, score in zip(row_indices, row_scores)
+                             if i in self.index_to_key]
+            if score_threshold is not None:
+                key_and_score = [(key, score) for key, score in key_and_score if cmp(score, score_threshold)]
+            results.append(key_and_score[:k])
+        return results
 
     def save_vectorstore(self, path: Union[str, Path], file_name: str) -> None:
+        """Append the changes since the last save to the journal, or write a full snapshot when
+        the store has no snapshot at this location yet or the journal is due for compaction."""
         if isinstance(path, str):
             path = Path(path)
         if not path.exists():
             path.mkdir(parents=True, exist_ok=True)
 
-        faiss_path = str(path / f"{file_name}.faiss")
-        pickle_path = str(path / f"{file_name}.pkl")
+        added, deleted = self._collapse_pending_ops()
+        n_ops = len(added) + len(deleted)
+        is_target = (self._persist_target is not None and self._persist_target[:2] == (str(path), file_name)
+                     and (path / f"{file_name}.faiss").exists())
+        if not is_target or self._journal_len + n_ops > max(self.compact_threshold, len(self) // 2):
+            self._save_snapshot(path, file_name)
+        elif n_ops > 0:
+            self._append_journal(path, file_name, added, deleted)
+        self._pending_ops = []
+
+    def _collapse_pending_ops(self) -> Tuple[Dict[int, str], List[int]]:
+        """Return the ids added and deleted since the last save, the ids both added and deleted cancel out."""
+        added: Dict[int, str] = {}
+        deleted: List[int] = []
+        for op in self._pending_ops:
+            if op[0] == "add":
+                added.update(zip(op[1], op[2]))
+            else:
+                for id_ in op[1]:
+                    if id_ in added:
+                        del added[id_]
+                    else:
+                        deleted.append(id_)
+        return added, deleted
 
+    def _save_snapshot(self, path: Path, file_name: str) -> None:
         faiss = dependable_faiss_import()
-        faiss.write_index(self.index, faiss_path)
-        with open(pickle_path, "wb") as f:
-            pickle.dump({"embedding_dim": self.embedding_dim, "index_to_key": self.index_to_key}, f)
+        # A memory-mapped index would be written as a reference to its snapshot
+        self._ensure_writable()
+        generation = uuid.uuid4().hex
+        faiss_path = path / f"{file_name}.faiss"
+        pickle_path = path / f"{file_name}.pkl"
+
+        # Write to temporary files first, so that a crash never leaves a half written snapshot
+        faiss.write_index(self.index, str(faiss_path) + ".tmp")
+        with open(str(pickle_path) + ".tmp", "wb") as f:
+            pickle.dump({"embedding_dim": self.embedding_dim, "index_to_key": self.index_to_key,
+                         "next_id": self.next_id, "index_params": self.index_params,
+                         "tombstones": self._tombstones, "generation": generation}, f)
+        os.replace(str(faiss_path) + ".tmp", faiss_path)
+        os.replace(str(pickle_path) + ".tmp", pickle_path)
+
+        # The old journal belongs to the previous generation, it is now part of the snapshot
+        for suffix in ["journal", "vec"]:
+            if (path / f"{file_name}.{suffix}").exists():
+                os.remove(path / f"{file_name}.{suffix}")
+        self._persist_target = (str(path), file_name, generation)
+        self._journal_len = 0
+
+    def _append_journal(self, path: Path, file_name: str, added: Dict[int, str], deleted: List[int]) -> None:
+        journal_path = path / f"{file_name}.journal"
+        vec_path = path / f"{file_name}.vec"
+
+        lines = []
+        if not journal_path.exists():
+            lines.append({"generation": self._persist_target[2]})
+            if vec_path.exists():
+                os.remove(vec_path)
+        if deleted:
+            lines.append({"op": "delete", "ids": deleted})
+        if added:
+            ids = list(added)
+            row = vec_path.stat().st_size // (4 * self.embedding_dim) if vec_path.exists() else 0
+            # The vectors are written before the journal line that refers to them
+            with open(vec_path, "ab") as f:
+                f.write(self._reconstruct(ids).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            lines.append({"op": "add", "ids": ids, "keys": [added[i] for i in ids], "row": row})
+
+        with open(journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_len += len(deleted) + len(added)
+
+    def _replay_journal(self, path: Path, file_name: str, generation: Optional[str]) -> int:
+        """Apply the journal of the loaded snapshot, return the number of replayed operations."""
+        journal_path = path / f"{file_name}.journal"
+        vec_path = path / f"{file_name}.vec"
+        if generation is None or not journal_path.exists():
+            return 0
+
+        vectors = None
+        if vec_path.exists() and vec_path.stat().st_size > 0:
+            vectors = np.memmap(vec_path, dtype=np.float32, mode="r").reshape(-1, self.embedding_dim)
+        n_ops = 0
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash while appending leaves a partial last line, it was never acknowledged
+                    break
+                if i == 0:
+                    if op.get("generation") != generation:
+                        # A journal left over from a previous snapshot, its changes are already in the snapshot
+                        f.close()
+                        os.remove(journal_path)
+                        if vec_path.exists():
+                            del vectors
+                            os.remove(vec_path)
+                        return 0
+                    continue
+                if op["op"] == "delete":
+                    self._remove_ids(op["ids"])
+                else:
+                    self._add_ids(op["ids"], op["keys"], vectors[op["row"]: op["row"] + len(op["ids"])])
+                n_ops += len(op["ids"])
+        return n_ops
+
+    @staticmethod
+    def _upgrade_index(index: Any) -> Any:
+        """Move the vectors of a store saved with positional ids into an IndexIDMap2 with the same ids."""
+        faiss = dependable_faiss_import()
+        if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF)):
+            return index
+        new_index = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+        if index.ntotal > 0:
+            new_index.add_with_ids(index.reconstruct_n(0, index.ntotal),
+                                   np.arange(index.ntotal, dtype=np.int64))
+        return new_index
+
+    @staticmethod
+    def _read_index(faiss_path: Path, mmap: bool) -> Tuple[Any, bool]:
+        """Read the index, with its inverted lists memory-mapped if mmap is set.
+        Return the index and whether its inverted lists are really on disk."""
+        faiss = dependable_faiss_import()
+        if mmap:
+            try:
+                index = faiss.read_index(str(faiss_path), faiss.IO_FLAG_MMAP)
+            except RuntimeError:
+                index = None
+            # IO_FLAG_MMAP only maps the inverted lists of an ivf index, any other index is read into memory
+            if isinstance(index, faiss.IndexIVF) and isinstance(
+                    faiss.downcast_InvertedLists(index.invlists), faiss.OnDiskInvertedLists):
+                return index, True
+            if index is not None:
+                return index, False
+        return faiss.read_index(str(faiss_path)), False
+
+    def _apply_index_params(self, index_params: Dict[str, Any]) -> "FaissVectorStore":
+        """Return the store with the given index parameters, rebuilt if they change how the vectors are stored."""
+        changed = {key: value for key, value in index_params.items()
+                   if key in self.index_params and self.index_params[key] != value}
+        if not changed:
+            return self
+        if not any(key in STRUCTURAL_PARAMS for key in changed):
+            self.index_params.update(changed)
+            self.set_search_params()
+            return self
+
+        print_with_color(f"The saved index differs from the configured one: {changed}, it is rebuilt.", "yellow")
+        if self.index_params["metric"] == "cosine" and changed.get("metric", "cosine") != "cosine":
+            print_with_color("The vectors were normalized for the cosine metric, their norms are lost.", "yellow")
+        params = {**self.index_params, **index_params}
+        if "nlist" in changed and "train_threshold" not in index_params:
+            params.pop("train_threshold")
+        ids = list(self.index_to_key)
+        store = FaissVectorStore(self.embedding_dim, next_id=self.next_id, compact_threshold=self.compact_threshold,
+                                 **params)
+        if ids:
+            store._add_ids(ids, [self.index_to_key[i] for i in ids], store._prepare(self._reconstruct(ids)))
+        # The next save writes a full snapshot of the rebuilt index
+        return store
 
     @classmethod
-    def load_vectorstore(cls, path: Union[str, Path], file_name: str) -> "FaissVectorStore":
+    def load_vectorstore(cls, path: Union[str, Path], file_name: str, mmap: bool = False,
+                         compact_threshold: int = 1000,
+                         index_params: Optional[Dict[str, Any]] = None) -> "FaissVectorStore":
+        """Load the snapshot and replay its journal.
+
+        Parameter:
+            mmap: bool, Memory-map the inverted lists of a trained ivf index instead of reading them into memory.
+                The index is read into memory before its first change, e.g. when the journal is replayed.
+                It has no effect on the "flat" and "hnsw" indexes, and on ivf indexes that are not trained yet.
+            compact_threshold: int, see FaissVectorStore
+            index_params: Optional[Dict[str, Any]], The configured parameters of FaissVectorStore. When they
+                differ from the saved ones, the search parameters are updated and the index is rebuilt if needed
+        """
         if isinstance(path, str):
             path = Path(path)
         if not path.exists():
@@ -131,11 +514,28 @@ class FaissVectorStore(BaseVectorStore):
         if not faiss_path.exists() or not pickle_path.exists():
             raise FileNotFoundError(f"Files {faiss_path} or {pickle_path} do not exist.")
 
-        faiss = dependable_faiss_import()
-        index = faiss.read_index(str(faiss_path))
         with open(str(pickle_path), "rb") as f:
             data = pickle.load(f)
             embedding_dim = data["embedding_dim"]
             index_to_key = data["index_to_key"]
+            next_id = data.get("next_id", None)
+            saved_params = data.get("index_params", {})
+            generation = data.get("generation", None)
+        if mmap and not saved_params.get("index_type", "flat").startswith("ivf"):
+            print_with_color(f"{file_name}: mmap has no effect on a {saved_params.get('index_type', 'flat')} "
+                             f"index, it is read into memory.", "yellow")
+            mmap = False
+        index, mapped = cls._read_index(faiss_path, mmap)
 
-        return cls(embedding_dim=embedding_dim, index=index, index_to_key=index_to_key)
+        upgraded_index = cls._upgrade_index(index)
+        vs = cls(embedding_dim=embedding_dim, index=upgraded_index, index_to_key=index_to_key, next_id=next_id,
+                 compact_threshold=compact_threshold, **saved_params)
+        vs._tombstones = data.get("tombstones", set())
+        if mapped and upgraded_index is index:
+            vs._mapped_path = faiss_path
+        vs._journal_len = vs._replay_journal(path, file_name, generation)
+        if generation is not None:
+            vs._persist_target = (str(path), file_name, generation)
+        if index_params:
+            vs = vs._apply_index_params(index_params)
+        return vs
@@ -0,0 +1,118 @@
+"""Compare the recall and search latency of the FaissVectorStore index types on random normalized vectors.
+
+With --mmap, compare instead the memory a saved store takes once loaded, with and without mmap.
+Each load runs in a fresh process, and the growth of its resident set size (RSS) is reported.
+Only the trained ivf indexes are expected to use less memory with mmap.
+
+Usage:
+    python -m cola.tools.vector_store.benchmark --n 20000 --dim 1024 --k 5
+    python -m cola.tools.vector_store.benchmark --n 100000 --dim 1024 --mmap
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+import numpy as np
+
+from cola.tools.vector_store.FaissVectorStore import FaissVectorStore, INDEX_TYPES
+
+
+def random_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_store(index_type: str, keys, vectors: np.ndarray, **kwargs) -> FaissVectorStore:
+    store = FaissVectorStore(embedding_dim=vectors.shape[1], index_type=index_type, **kwargs)
+    store.add_embeddings(keys, vectors)
+    return store
+
+
+def search_all(store: FaissVectorStore, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    results = [[key for key, _ in store.similarity_search(query, k=k)] for query in queries]
+    latency = (time.perf_counter() - start) / len(queries)
+    return results, latency
+
+
+def _load_rss(path: str, mmap: bool, queries: np.ndarray, k: int, result: "multiprocessing.Queue") -> None:
+    process = psutil.Process()
+    before = process.memory_info().rss
+    store = FaissVectorStore.load_vectorstore(path, "store", mmap=mmap)
+    loaded = process.memory_info().rss
+    for query in queries:
+        store.similarity_search(query, k=k)
+    searched = process.memory_info().rss
+    result.put((loaded - before, searched - before, store._mapped_path is not None))
+
+
+def measure_load_rss(path: Path, mmap: bool, queries: np.ndarray, k: int):
+    """Load the store in a fresh process, return the RSS growth after the load and after the searches,
+    and whether the index stayed memory-mapped."""
+    context = multiprocessing.get_context("spawn")
+    result = context.Queue()
+    process = context.Process(target=_load_rss, args=(str(path), mmap, queries, k, result))
+    process.start()
+    measure = result.get()
+    process.join()
+    return measure
+
+
+def compare_mmap(keys, vectors: np.ndarray, queries: np.ndarray, k: int, **params) -> None:
+    mb = 1024 * 1024
+    print(f"{'index_type':<10} {'mmap':>5} {'mapped':>7} {'load (MB)':>10} {'search (MB)':>12}")
+    for index_type in INDEX_TYPES:
+        with tempfile.TemporaryDirectory() as folder:
+            build_store(index_type, keys, vectors, **params).save_vectorstore(folder, "store")
+            for mmap in [False, True]:
+                loaded, searched, mapped = measure_load_rss(Path(folder), mmap, queries, k)
+                print(f"{index_type:<10} {str(mmap):>5} {str(mapped):>7} {loaded / mb:>10.1f} {searched / mb:>12.1f}")
+                # mmap must only be reported for the indexes whose inverted lists are really on disk
+                assert mapped == (mmap and index_type.startswith("ivf")), index_type
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20000, help="Number of stored vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="Dimension of the vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=5, help="Number of neighbors")
+    parser.add_argument("--nlist", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef_search", type=int, default=64)
+    parser.add_argument("--pq_m", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mmap", action="store_true", help="Compare the memory of a loaded store with and without mmap")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = random_vectors(args.n, args.dim, rng)
+    queries = random_vectors(args.queries, args.dim, rng)
+    keys = [str(i) for i in range(args.n)]
+    params = dict(nlist=args.nlist, nprobe=args.nprobe, ef_search=args.ef_search, pq_m=args.pq_m,
+                  train_threshold=min(args.n, 39 * args.nlist))
+    if args.mmap:
+        compare_mmap(keys, vectors, queries, args.k, **params)
+        return
+
+    ground_truth = None
+    print(f"{'index_type':<10} {'build (s)':>10} {'search (ms)':>12} {'recall@' + str(args.k):>10}")
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        store = build_store(index_type, keys, vectors, **params)
+        build_time = time.perf_counter() - start
+
+        results, latency = search_all(store, queries, args.k)
+        if ground_truth is None:
+            # The flat index is exhaustive, it is the reference for the others
+            ground_truth = results
+        recall = np.mean([len(set(result) & set(truth)) / args.k for result, truth in zip(results, ground_truth)])
+        print(f"{index_type:<10} {build_time:>10.2f} {latency * 1000:>12.3f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,33 @@
 from typing import Dict
 from cola.fundamental.base_role import BaseRole
+from cola.session import get_default_session, get_session
 from functools import wraps
 
-agents_instance: Dict[str, BaseRole] = {}  # When a Role is instantiated it is stored in this dictionary, Role Name: Role Instance
-agents_capability: Dict[str, str] = {}  # When a Role is instantiated it is stored in this dictionary, Role Name: Role Capabilities
+# The roles of the default session, each session keeps its own, see cola.session
+agents_instance: Dict[str, BaseRole] = get_default_session().agents_instance  # Role Name: Role Instance
+agents_capability: Dict[str, str] = get_default_session().agents_capability  # Role Name: Role Capabilities
 
 
 class RegisterAgent:
     """
     Save all Agent roles and capabilities
-    Save all Agent instances
+    Save all Agent instances, in the session they are created in
     """
 
     def __init__(self, ignore_capability: bool = False):
         self.ignore_capability = ignore_capability
 
     def __call__(self, cls):
-        global agents_instance, agents_capability
-
         @wraps(cls)
         def wrapper(*args, **kwargs):
             instance = cls(*args, **kwargs)
             role = instance.role
             capability = instance.capability
 
-            agents_instance[str(role)] = instance
+            session = get_session()
+            session.agents_instance[str(role)] = instance
             if not self.ignore_capability:
-                agents_capability[str(role)] = capability
+                session.agents_capability[str(role)] = capability
             return instance
 
         return wrapper
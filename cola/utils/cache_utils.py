@@ -0,0 +1,13 @@
+# Kept free of cola imports, so that any module can invalidate the prompt caches without import cycles
+
+_prompt_cache_version = 0
+
+
+def get_prompt_cache_version() -> int:
+    return _prompt_cache_version
+
+
+def bump_prompt_cache_version() -> None:
+    """Make the system prompts cached so far stale, they are rendered again on their next use."""
+    global _prompt_cache_version
+    _prompt_cache_version += 1
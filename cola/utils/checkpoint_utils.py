@@ -0,0 +1,122 @@
+from cola.fundamental.base_role import BaseRole
+from cola.utils.data_utils import PrivateData
+from cola.session import Session, get_session
+from pywinauto.controls.uiawrapper import UIAWrapper
+from pywinauto.uia_element_info import UIAElementInfo
+from PIL import Image
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union, Any
+import gzip
+import pickle
+import os
+
+# Role attributes that make up the progress of a role in the session
+ROLE_STATE_ATTRS = ["session_step", "session_messages", "request_times", "st_memory_store"]
+_IMAGE_PLACEHOLDER = {"type": "text", "text": "[The image was not kept in the checkpoint]"}
+
+
+class _CheckpointPickler(pickle.Pickler):
+    # Windows are kept by handle, images are dropped, the rest is pickled as is
+    def persistent_id(self, obj: Any) -> Optional[Tuple]:
+        if isinstance(obj, UIAWrapper):
+            try:
+                return "window", obj.handle or None
+            except Exception:
+                return "window", None
+        if isinstance(obj, Image.Image):
+            return "image", None
+        if isinstance(obj, dict) and obj.get("type") == "image_url":
+            return "image_url", None
+        return None
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid: Tuple) -> Any:
+        kind, value = pid
+        if kind == "window" and value:
+            try:
+                return UIAWrapper(UIAElementInfo(value))
+            except Exception:
+                # The window was closed after the checkpoint
+                return None
+        if kind == "image_url":
+            return dict(_IMAGE_PLACEHOLDER)
+        return None
+
+
+class CheckpointManager:
+    """Save the progress of a session after each step, so that it can be resumed after a crash.
+
+    A checkpoint holds the data waiting for the next role, the contexts of the ContextualDataCenter,
+    the state of the roles and the counters of the logger. It is a gzipped pickle, windows are stored
+    by their handle and images are dropped.
+
+    Parameter:
+        folder: Union[str, Path], Folder of the session, usually the log folder
+        agents: Dict[str, BaseRole], The roles of the session
+        every_n_steps: int, A checkpoint is written every n steps
+        session: Optional[Session], The session whose contexts and logger are saved, the current one by default
+    """
+
+    def __init__(self, folder: Union[str, Path], agents: Dict[str, BaseRole], every_n_steps: int = 1,
+                 session: Optional[Session] = None):
+        self.session = get_session() if session is None else session
+        self.path = Path(folder) / "checkpoint.pkl.gz"
+        self.agents = agents
+        self.every_n_steps = max(every_n_steps, 1)
+        self.n_steps = 0
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def save(self, data: Optional[PrivateData], finished: bool = False, force: bool = False) -> bool:
+        """
+        Write a checkpoint, unless it is not the turn of this step.
+
+        Parameter:
+            data: Optional[PrivateData], The data waiting for the next role
+            finished: bool, Whether the session is over
+            force: bool, Write even if it is not the turn of this step
+        Return:
+            bool, Whether a checkpoint was written
+        """
+        self.n_steps += 1
+        if not (force or finished or self.n_steps % self.every_n_steps == 0):
+            return False
+        state = dict(
+            data=data,
+            finished=finished,
+            cdc=self.session.cdc.get_state(),
+            logger=self.session.logger.get_state(),
+            roles={
+                role: {attr: getattr(agent, attr) for attr in ROLE_STATE_ATTRS if hasattr(agent, attr)}
+                for role, agent in self.agents.items()
+            },
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with gzip.open(tmp_path, "wb", compresslevel=5) as f:
+            _CheckpointPickler(f, protocol=pickle.HIGHEST_PROTOCOL).dump(state)
+        # The previous checkpoint stays valid until the new one is complete
+        os.replace(tmp_path, self.path)
+        return True
+
+    def load(self) -> Dict:
+        """
+        Restore the contexts, the roles and the logger from the checkpoint.
+
+        Return:
+            Dict, with the keys data and finished, see save()
+        """
+        if not self.exists():
+            raise FileNotFoundError(f"Checkpoint {self.path} not found!.")
+        with gzip.open(self.path, "rb") as f:
+            state = _CheckpointUnpickler(f).load()
+
+        self.session.cdc.set_state(state["cdc"])
+        self.session.logger.set_state(state["logger"])
+        for role, role_state in state["roles"].items():
+            if role in self.agents:
+                for attr, value in role_state.items():
+                    setattr(self.agents[role], attr, value)
+        return dict(data=state["data"], finished=state["finished"])
@@ -0,0 +1,85 @@
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from config.config import Config
+from typing import Dict, List, Tuple, Optional
+import threading
+import asyncio
+import httpx
+
+config = Config.get_instance()
+
+# Process-wide clients keyed by (api_base, api_key), so that all roles share one connection pool per endpoint
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+_async_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_lock = threading.Lock()
+
+
+def _http_client_params() -> Dict:
+    http_config = config["http_client"]
+    return dict(
+        limits=httpx.Limits(
+            max_connections=http_config["max_connections"],
+            max_keepalive_connections=http_config["max_keepalive_connections"],
+            keepalive_expiry=http_config["keepalive_expiry"],
+        ),
+        timeout=httpx.Timeout(http_config["read_timeout"], connect=http_config["connect_timeout"]),
+        http2=http_config["http2"],
+    )
+
+
+def get_openai_client(openai_api_key: str, openai_api_base: Optional[str] = None) -> OpenAI:
+    """Get the shared OpenAI client of the endpoint, created on first use."""
+    key = (openai_api_base or "", openai_api_key)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = OpenAI(
+                api_key=openai_api_key, base_url=openai_api_base or None,
+                max_retries=config["http_client"]["max_retries"],
+                http_client=DefaultHttpxClient(**_http_client_params())
+            )
+        return _clients[key]
+
+
+def get_async_openai_client(openai_api_key: str, openai_api_base: Optional[str] = None) -> AsyncOpenAI:
+    """Get the shared AsyncOpenAI client of the endpoint, created on first use.
+
+    The underlying connection pool is bound to the event loop that first uses it, run all sessions on one loop.
+    """
+    key = (openai_api_base or "", openai_api_key)
+    with _lock:
+        if key not in _async_clients:
+            _async_clients[key] = AsyncOpenAI(
+                api_key=openai_api_key, base_url=openai_api_base or None,
+                max_retries=config["http_client"]["max_retries"],
+                http_client=DefaultAsyncHttpxClient(**_http_client_params())
+            )
+        return _async_clients[key]
+
+
+def _pop_clients() -> Tuple[List[OpenAI], List[AsyncOpenAI]]:
+    with _lock:
+        clients, async_clients = list(_clients.values()), list(_async_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+    return clients, async_clients
+
+
+async def _close_async_clients(async_clients: List[AsyncOpenAI]) -> None:
+    # A pool bound to an event loop that is already closed can not be closed cleanly, it is dropped
+    await asyncio.gather(*(client.close() for client in async_clients), return_exceptions=True)
+
+
+def close_openai_clients() -> None:
+    """Close the connection pools of the shared clients, use aclose_openai_clients inside an event loop."""
+    clients, async_clients = _pop_clients()
+    for client in clients:
+        client.close()
+    if async_clients:
+        asyncio.run(_close_async_clients(async_clients))
+
+
+async def aclose_openai_clients() -> None:
+    """Close the connection pools of the shared clients from the event loop that uses the async clients."""
+    clients, async_clients = _pop_clients()
+    for client in clients:
+        client.close()
+    await _close_async_clients(async_clients)
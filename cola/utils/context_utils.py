@@ -0,0 +1,60 @@
+from typing import Any, Dict, List, Optional, Tuple
+from cola.utils.token_utils import count_tokens, count_message_tokens, truncate_tokens
+from cola.utils.print_utils import print_with_color
+
+
+def fit_texts(texts: List[str], max_tokens: Optional[int], model: Optional[str] = None) -> Tuple[List[str], int]:
+    """Keep the last texts that fit in the budget, the first texts are the least relevant ones.
+
+    If not even the last text fits, it is truncated to the budget.
+
+    Return:
+        Tuple[List[str], int], The kept texts and the number of dropped texts.
+    """
+    if max_tokens is None or not texts:
+        return texts, 0
+    kept = []
+    n_tokens = 0
+    for text in reversed(texts):
+        n_tokens += count_tokens(text, model)
+        if n_tokens > max_tokens:
+            break
+        kept.append(text)
+    if not kept:
+        return [truncate_tokens(texts[-1], max_tokens, model)], len(texts) - 1
+    return kept[::-1], len(texts) - len(kept)
+
+
+def fit_context(query_messages: List[Dict],
+                episodic_messages: List[Dict],
+                linked_messages: List[Dict],
+                max_tokens: Optional[int],
+                model: Optional[str] = None) -> Tuple[List[Dict], List[Dict], Dict[str, int]]:
+    """Drop whole messages until the request fits in the budget.
+
+    The short-term messages go first, then the episodic messages after the system prompt, oldest first.
+    The system prompt and the query messages are always kept.
+
+    Return:
+        Tuple[List[Dict], List[Dict], Dict[str, int]], The episodic and linked messages that are kept,
+        and the number of dropped messages per section.
+    """
+    dropped = {"linked_messages": 0, "episodic_messages": 0}
+    if max_tokens is None:
+        return episodic_messages, linked_messages, dropped
+
+    n_tokens = count_message_tokens(episodic_messages + linked_messages + query_messages, model)
+    linked_messages = list(linked_messages)
+    while n_tokens > max_tokens and linked_messages:
+        n_tokens -= count_message_tokens([linked_messages.pop(0)], model)
+        dropped["linked_messages"] += 1
+    episodic_messages = list(episodic_messages)
+    while n_tokens > max_tokens and len(episodic_messages) > 1:
+        n_tokens -= count_message_tokens([episodic_messages.pop(1)], model)
+        dropped["episodic_messages"] += 1
+    return episodic_messages, linked_messages, dropped
+
+
+def report_dropped(role: Any, section: str, n_dropped: int) -> None:
+    if n_dropped > 0:
+        print_with_color(f"{role}: {n_dropped} {section} dropped to fit the token budget.", "yellow")
@@ -1,5 +1,7 @@
 from cola.fundamental.singleton import Singleton
+from contextlib import contextmanager
 from pathlib import Path
+import threading
 from typing import Union, Any, Dict, Optional, Tuple, List
 from cola.utils.json_utils import save_json, load_json
 from cola.utils.datatype import RoleType, RoleKey
@@ -14,8 +16,14 @@ class ContextualDataCenter(metaclass=Singleton):
         # Store per-agent query parameters for fallbacks
         self._query_params: Dict[RoleType, Tuple[List, Dict]] = PrivateData()  # <role space>, role: query_params
         # Storing Role's public data
-        self.role_context: PrivateData = PrivateData(**{str(k): None for k in RoleKey})
-        self.role_context.role_infos = []
+        self._role_context: PrivateData = PrivateData(**{str(k): None for k in RoleKey})
+        self._role_context.role_infos = []
+        # Information collected by the roles, keyed by (distribution round, distribution index)
+        self._role_infos: Dict[Tuple[int, int], List] = {}
+        self._distribution_round = 0
+        # Subtasks dispatched in parallel run with their own role context and distribution index
+        self._local = threading.local()
+        self._lock = threading.Lock()
         # Storing public data for sessions
         self.session_context: PrivateData = PrivateData()
         # Storing Private Data for Base Role
@@ -23,6 +31,73 @@ class ContextualDataCenter(metaclass=Singleton):
         # Storing data for Summary
         self.summary_context: PrivateData = PrivateData(**{str(k): PrivateData() for k in RoleType})
 
+    @property
+    def role_context(self) -> 'PrivateData':
+        return getattr(self._local, "role_context", self._role_context)
+
+    @role_context.setter
+    def role_context(self, value: 'PrivateData') -> None:
+        self._role_context = value
+
+    def start_distribution(self) -> None:
+        """Start a new distribution of subtasks, the information of the previous ones is kept before it."""
+        with self._lock:
+            self._distribution_round += 1
+        self.set_distribution_index(0)
+
+    def set_distribution_index(self, index: int) -> None:
+        """Set the distribution entry that the current thread works on."""
+        self._local.info_key = (self._distribution_round, index)
+
+    def add_role_info(self, info: Any) -> None:
+        """Add information to role_infos, ordered by distribution entry whatever the order the entries finish in."""
+        with self._lock:
+            key = getattr(self._local, "info_key", (self._distribution_round, 0))
+            self._role_infos.setdefault(key, []).append(info)
+            # Updated in place, the list is shared with the parallel role contexts
+            self._role_context.role_infos[:] = [i for k in sorted(self._role_infos) for i in self._role_infos[k]]
+
+    @contextmanager
+    def parallel_context(self, index: int):
+        """Run a distribution entry in the current thread with its own copy of the role context.
+
+        Parameter:
+            index: int, Index of the distribution entry
+        """
+        self._local.role_context = PrivateData(**self._role_context)
+        self.set_distribution_index(index)
+        try:
+            yield self._local.role_context
+        finally:
+            del self._local.role_context
+            del self._local.info_key
+
+    def get_state(self) -> Dict[str, Any]:
+        """The contexts of the session, without the query parameters, see set_state."""
+        with self._lock:
+            return dict(
+                switch_to=self.switch_to,
+                session_data=self._session_data,
+                role_context=self._role_context,
+                session_context=self.session_context,
+                base_role_context=self.base_role_context,
+                summary_context=self.summary_context,
+                role_infos=self._role_infos,
+                distribution_round=self._distribution_round,
+            )
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        """Restore the contexts saved by get_state."""
+        with self._lock:
+            self.switch_to = state["switch_to"]
+            self._session_data = state["session_data"]
+            self._role_context = state["role_context"]
+            self.session_context = state["session_context"]
+            self.base_role_context = state["base_role_context"]
+            self.summary_context = state["summary_context"]
+            self._role_infos = state["role_infos"]
+            self._distribution_round = state["distribution_round"]
+
     def set_context(self, role: RoleType, data: 'PrivateData') -> None:
         self._session_data[role] = data
 
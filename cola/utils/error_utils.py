@@ -8,3 +8,7 @@ class MaxQueryTimesError(Exception):
 
 class MaxRetryTimesError(Exception):
     pass
+
+
+class LMCacheMissError(Exception):
+    pass
@@ -1,6 +1,7 @@
 from cola.memory.json_memory import JsonStringMemory
 from cola.tools.vector_store.FaissVectorStore import FaissVectorStore
 from cola.tools.embedding.OpenAIEmbedding import OpenAIEmbedding
+from cola.tools.embedding.SqliteEmbeddingCache import get_default_embedding_cache
 from config.config import Config
 from pathlib import Path
 import json
@@ -8,15 +9,24 @@ from typing import List, Optional, Dict, Union
 from tqdm import tqdm
 import re
 
-__all__ = ["load_gaia_examples", "make_gaia_examples"]
+__all__ = ["load_gaia_examples", "make_gaia_examples", "get_gaia_memory"]
 
 config = Config.get_instance()
 
 GAIA_validation_path = Path("GAIA/2023/validation/metadata.jsonl")
 
-openai_embedding = OpenAIEmbedding(config["openai_api_key"], config["openai_api_base"])
-faiss_vector_store = FaissVectorStore(openai_embedding.get_embedding_dim())
-gaia_memory = JsonStringMemory(openai_embedding, faiss_vector_store)
+_gaia_memory: Optional[JsonStringMemory] = None
+
+
+def get_gaia_memory() -> JsonStringMemory:
+    """Build the GAIA example memory on first use."""
+    global _gaia_memory
+    if _gaia_memory is None:
+        openai_embedding = OpenAIEmbedding(config["openai_api_key"], config["openai_api_base"],
+                                           cache=get_default_embedding_cache())
+        faiss_vector_store = FaissVectorStore(openai_embedding.get_embedding_dim())
+        _gaia_memory = JsonStringMemory(openai_embedding, faiss_vector_store)
+    return _gaia_memory
 
 
 def data_to_message(data: Dict) -> str:
@@ -50,6 +60,7 @@ def make_gaia_examples(save_path: Union[str, Path], file_name: str,
     if levels is None:
         levels = [1, 2, 3]
 
+    summaries, stores = [], []
     with open(gaia_path, "r", encoding="utf-8") as f:
         f = tqdm(f, desc="Processing GAIA data", total=165)
         for key, line in enumerate(f):
@@ -63,14 +74,18 @@ def make_gaia_examples(save_path: Union[str, Path], file_name: str,
                 steps = [step.strip() for step in steps if step.strip()]
 
                 data = {"task": cur_line["Question"], "steps": steps}
-                store = data_to_message(data)
-                gaia_memory.add(summary=data["task"], store=store)
+                summaries.append(data["task"])
+                stores.append(data_to_message(data))
+    # Embed all the tasks with batched requests instead of one request per task
+    gaia_memory = get_gaia_memory()
+    gaia_memory.add_batch(summaries, stores)
 
     # print(gaia_memory.get_all_memory())
     gaia_memory.save_memory(save_path, file_name)
 
 
 def load_gaia_examples(path: Union[str, Path], file_name: str):
+    gaia_memory = get_gaia_memory()
     gaia_memory.load_memory(path, file_name)
     # print(gaia_memory.get_all_memory())
     return gaia_memory
@@ -1,6 +1,11 @@
 import json
 from pathlib import Path
-from typing import List, Union, Dict
+from typing import List, Union, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def load_json(file_path: Union[str, Path]) -> Dict:
@@ -38,16 +43,94 @@ def check_json_format(json_string: str) -> bool:
     return True
 
 
-def extract_json_from_response(text: str, symbol: str = "json") -> Dict:
-    """Extract JSON from a string."""
-    if "```" not in text:
-        raise ValueError("json format error, missing ```")
-    text = text.split("```")[1].strip()
-    if symbol is not None:
-        if text.startswith(symbol):
-            text = text[len(symbol):].strip()
+def loads(text: str):
+    """Parse a JSON string, with orjson when it is installed."""
+    if orjson is not None:
+        # orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _fenced_block(text: str, symbol: Optional[str]) -> Optional[str]:
+    # Content of the first code fence, an unterminated fence runs to the end of the text
+    start = text.find("```")
+    if start == -1:
+        return None
+    start += 3
+    end = text.find("```", start)
+    block = (text[start:] if end == -1 else text[start:end]).strip()
+    if symbol is not None and block[:len(symbol)].lower() == symbol:
+        block = block[len(symbol):].strip()
+    return block
+
+
+def _scan_object(text: str, start: int) -> str:
+    """Scan the object opened at text[start] up to its closing brace, dropping the trailing commas."""
+    out = []
+    depth = 0
+    in_string = escape = False
+    comma = None  # position in out of the last comma outside the strings
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+            out.append(c)
+            continue
+        if c in " \t\r\n":
+            out.append(c)
+            continue
+        if c in "}]" and comma is not None:
+            out[comma] = ""
+        comma = None
+        if c == '"':
+            in_string = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            depth -= 1
+            if depth == 0:
+                out.append(c)
+                return "".join(out)
+        elif c == ",":
+            comma = len(out)
+        out.append(c)
+    raise ValueError("json format error, the braces are not balanced.")
+
+
+def _parse_first_object(text: str) -> Optional[Dict]:
+    # The first balanced {...} of the text, None if there is none or it does not parse
+    start = text.find("{")
+    if start == -1:
+        return None
     try:
-        res = json.loads(text)
-    except json.JSONDecodeError:
-        raise ValueError("json format error, unable to parse to json format.")
+        return loads(_scan_object(text, start))
+    except (ValueError, json.JSONDecodeError):
+        return None
+
+
+def extract_json_from_response(text: str, symbol: str = "json") -> Union[Dict, List]:
+    """Extract JSON from a string.
+
+    The content of the first code fence is parsed directly, it may be an object or an array.
+    If that fails, the first balanced {...} of the fence, then of the whole text, is scanned
+    and parsed with the trailing commas removed.
+    """
+    block = _fenced_block(text, symbol)
+    if block is not None:
+        try:
+            return loads(block)
+        except json.JSONDecodeError:
+            pass
+        res = _parse_first_object(block)
+        if res is not None:
+            return res
+
+    res = _parse_first_object(text)
+    if res is None:
+        raise ValueError("json format error, no json object could be parsed.")
     return res
@@ -0,0 +1,60 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import json
+
+try:
+    import tiktoken
+except ImportError:
+    # Without tiktoken the number of tokens is estimated from the number of characters
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: Optional[str]) -> Any:
+    if model is not None:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens of a text with the tokenizer of the model, estimated as 4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return len(text) // 4 + 1
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def count_record_tokens(record: Any, model: Optional[str] = None) -> int:
+    """Count the tokens of a json serializable record."""
+    if not isinstance(record, str):
+        record = json.dumps(record, ensure_ascii=False, default=str)
+    return count_tokens(record, model)
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Keep the first max_tokens tokens of a text."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    marker = "\n...(truncated)"
+    if tiktoken is None:
+        return text[:max(max_tokens - 1, 0) * 4] + marker
+    encoding = _get_encoding(model)
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens]) + marker
+
+
+def count_message_tokens(messages: List[Dict], model: Optional[str] = None) -> int:
+    """Count the tokens of chat messages, the text parts of multimodal contents are counted, images are not."""
+    n_tokens = 0
+    for message in messages:
+        # Every message costs a few tokens for its role and separators
+        n_tokens += 4
+        content = message.get("content", "")
+        if isinstance(content, str):
+            n_tokens += count_tokens(content, model)
+        elif isinstance(content, list):
+            n_tokens += sum(count_tokens(part.get("text", ""), model) for part in content if isinstance(part, dict))
+    return n_tokens
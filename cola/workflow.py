@@ -1,19 +1,32 @@
 from cola.fundamental import BaseWorkflow, BaseRole
 from cola.utils.datatype import WorkflowEvent, RoleType
-from typing import Dict, Union
+from typing import Dict, Union, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
 from cola.utils.print_utils import format_print_dict, print_with_color
-from config.config import Config
 from cola.utils.data_utils import PrivateData, ContextualDataCenter
-
-config = Config.get_instance()
-cdc = ContextualDataCenter()
+from cola.utils.checkpoint_utils import CheckpointManager
+from cola.session import Session, get_session, use_session
 
 
 class Workflow(BaseWorkflow):
-    def __init__(self, all_agents: Dict[str, BaseRole]):
+    def __init__(self, all_agents: Dict[str, BaseRole], checkpoint: Optional[CheckpointManager] = None,
+                 session: Optional[Session] = None):
         super().__init__()
+        self.session = get_session() if session is None else session  # the session of the roles
+        self.cdc: ContextualDataCenter = self.session.cdc
         self.all_agents = all_agents
         self.handoff = False
+        self.checkpoint = checkpoint
+        self.accomplished: Optional[bool] = None  # how the last task ended, None while it runs
+
+        # Distribution entries of the roles that do not use the desktop run in these threads
+        settings = self.session.config["parallel_dispatch"] or {}
+        self._pool = ThreadPoolExecutor(max_workers=settings.get("max_workers", 4), thread_name_prefix="workflow")
+        self._branches: Dict[int, Future] = {}  # distribution index: future of the last data of the entry
+        # A role handles one step at a time, and one parallel entry at a time
+        self._role_locks = {role: threading.Lock() for role in all_agents}
+        self._branch_locks = {role: threading.Lock() for role in all_agents}
 
     @staticmethod
     def get_receiver(data: PrivateData):
@@ -34,7 +47,76 @@ class Workflow(BaseWorkflow):
     def specify_role(self, role: RoleType, event: WorkflowEvent,
                      data: PrivateData = None,
                      handoff: bool = False, **kwargs):
-        return self.all_agents[role].step(event=event, data=data, handoff=handoff, **kwargs)
+        with self._role_locks[role]:
+            return self.all_agents[role].step(event=event, data=data, handoff=handoff, **kwargs)
+
+    def _run_branch(self, data: PrivateData, wait_for: List[Future]) -> Optional[PrivateData]:
+        """Run a distribution entry until its role hands back to the TaskScheduler."""
+        for future in wait_for:
+            result = future.result()
+            if not self._is_finished(result):
+                # A dependency failed, its result is reported in place of this entry
+                return result
+        role = self.get_receiver(data)
+        # The other roles of the entry, e.g. the Executor and the Reviewer, are forked for it
+        forks: Dict[str, BaseRole] = {}
+        # The threads of the pool do not inherit the session
+        with use_session(self.session), self._branch_locks[role], self.cdc.parallel_context(data.distribution_index):
+            try:
+                while True:
+                    receiver = self.get_receiver(data)
+                    if receiver == role:
+                        data = self.specify_role(role=receiver, event=self.get_event(data), data=data)
+                    else:
+                        if receiver not in forks:
+                            with self._role_locks[receiver]:
+                                forks[receiver] = self.all_agents[receiver].fork()
+                        data = forks[receiver].step(event=self.get_event(data), data=data)
+                    if data is None or data.receiver in [RoleType.TaskScheduler, RoleType.Planner,
+                                                         RoleType.Interactor]:
+                        return data
+                    format_print_dict(data)
+            finally:
+                for receiver, fork in forks.items():
+                    with self._role_locks[receiver]:
+                        self.all_agents[receiver].merge(fork)
+
+    @staticmethod
+    def _is_finished(data: Optional[PrivateData]) -> bool:
+        return data is not None and data.event == WorkflowEvent.TaskScheduler_distribute_next_subtask
+
+    def _join_branches(self, indexes: List[int] = None) -> Tuple[bool, Optional[PrivateData]]:
+        """Wait for the parallel entries, all of them by default.
+        Return whether one of them failed, and the result of the first one that failed."""
+        if indexes is None:
+            indexes = list(self._branches)
+        failed, failure = False, None
+        for index in sorted(i for i in indexes if i in self._branches):
+            result = self._branches.pop(index).result()
+            if not failed and not self._is_finished(result):
+                failed, failure = True, result
+        return failed, failure
+
+    def _schedule(self, data: PrivateData) -> Optional[PrivateData]:
+        """Start the parallel entries carried by the data, and wait for the ones the data depends on.
+        If one of them failed, its result is processed instead of the data."""
+        branches, wait_for = data.pop("parallel_branches", []), data.pop("wait_for", [])
+        for branch in branches:
+            branch_wait_for = [self._branches[i] for i in branch.pop("wait_for", []) if i in self._branches]
+            self._branches[branch.distribution_index] = self._pool.submit(self._run_branch, branch, branch_wait_for)
+        if not self._branches:
+            return data
+
+        if data.receiver == RoleType.Planner or data.event == WorkflowEvent.TaskScheduler_distribute_subtask:
+            # The results are collected or the subtasks are distributed again, every entry has to be done
+            failed, failure = self._join_branches()
+        else:
+            failed, failure = self._join_branches(wait_for)
+        if failed:
+            # The main loop handles the failure, the other entries finish first
+            self._join_branches()
+            return failure
+        return data
 
     def next_step(self, data: PrivateData):
         role = self.get_receiver(data)
@@ -44,16 +126,39 @@ class Workflow(BaseWorkflow):
             self.handoff = False
         return self.specify_role(role=role, event=event, data=data, handoff=handoff)
 
+    def _save_checkpoint(self, data: PrivateData, finished: bool = False):
+        # Entries running in parallel and pending handoffs cannot be restored, a later step is saved instead
+        if self.checkpoint is None or self._branches or self.handoff:
+            return
+        self.checkpoint.save(data, finished=finished)
+
+    def resume(self):
+        """Continue the session from its last checkpoint, see step()."""
+        with use_session(self.session):
+            state = self.checkpoint.load()
+        data = state["data"]
+        if state["finished"]:
+            self.accomplished = self.get_event(data) == WorkflowEvent.Interactor_task_accomplished
+            return data.answer if self.accomplished else ""
+        return self.step(data)
+
     def step(self, data: PrivateData = None):
+        with use_session(self.session):
+            return self._step(data)
+
+    def _step(self, data: PrivateData = None):
+        self.accomplished = None
         while True:
             # 1. process cycle
             data = self.next_step(data)
-            if data is None and cdc.switch_to is not None:
-                data = cdc.get_context(cdc.switch_to)
+            if data is not None:
+                data = self._schedule(data)
+            if data is None and self.cdc.switch_to is not None:
+                data = self.cdc.get_context(self.cdc.switch_to)
                 if data is None:
                     raise ValueError(
-                        f"Switching role `{cdc.switch_to}` has no context. Please jump after a role has performed a task.")
-                cdc.switch_to = None
+                        f"Switching role `{self.cdc.switch_to}` has no context. Please jump after a role has performed a task.")
+                self.cdc.switch_to = None
                 self.handoff = True
             format_print_dict(data)
             event = self.get_event(data)
@@ -61,8 +166,14 @@ class Workflow(BaseWorkflow):
             if event == WorkflowEvent.Interactor_task_failure:
                 # TODO: Add Task Failure Handling
                 print("task failure!", data)
+                self.accomplished = False
+                self._save_checkpoint(data, finished=True)
                 break
             # 3. Returns the result if it is a task completion
             elif event == WorkflowEvent.Interactor_task_accomplished:
+                self.accomplished = True
+                self._save_checkpoint(data, finished=True)
                 return data.answer
+            # 4. Save the progress, a resumed session starts with the data
+            self._save_checkpoint(data)
         return ""
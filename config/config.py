@@ -46,8 +46,32 @@ class Config(defaultdict):
 
         self["log_folder"].mkdir(parents=True, exist_ok=True)
 
+    def set_session_id(self, session_id: str):
+        """Switch to the log folder of another session, e.g. to resume it."""
+        if session_id == self["session_id"]:
+            return
+        previous = self["log_folder"]
+        self["session_id"] = session_id
+        self["log_folder"] = previous.parent / session_id
+        self["log_folder"].mkdir(parents=True, exist_ok=True)
+        try:
+            # Remove the folder created for this run if nothing was logged into it
+            previous.rmdir()
+        except OSError:
+            pass
+
+    def for_session(self, session_id: str) -> "Config":
+        """A copy of the configuration for another session running in the same process, see cola.session."""
+        config = Config()
+        config.update(self)
+        config["session_id"] = session_id
+        config["log_folder"] = self["log_folder"].parent / session_id
+        config["log_folder"].mkdir(parents=True, exist_ok=True)
+        return config
+
     def safe_check(self):
         assert self["interact_mode"] in ["proactive", "passive", "non-interactive"]
+        assert self["lm_cache"]["mode"] in ["record", "replay"]
 
 
 config = Config.get_instance()
@@ -1,27 +1,35 @@
 from pathlib import Path
 import json
+import threading
 from typing import Dict, List, Union
 from cola.utils.image_utils import save_image
-from config.config import Config
+from cola.session import Singleton, get_session
 
-config = Config.get_instance()
-
-
-class ChatMessageLogger:
-    _instance = None
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
 
+class ChatMessageLogger(metaclass=Singleton):
     def __init__(self):
-        self.log_folder = config["log_folder"]
+        self.log_folder = get_session().config["log_folder"]
         self.n_data = 1
         self.n_query = 1
         self.last_md_path: Path = Path(self.log_folder)
         self.role_last_md_path: Dict = dict()
         self._role = None
+        self._lock = threading.Lock()  # the roles may log from several threads
+
+    def set_log_folder(self, log_folder: Path):
+        """Log into another folder, e.g. the folder of a resumed session."""
+        self.log_folder = log_folder
+        self.last_md_path = Path(log_folder)
+
+    def get_state(self) -> Dict:
+        return dict(n_data=self.n_data, n_query=self.n_query, role_last_md_path=dict(self.role_last_md_path))
+
+    def set_state(self, state: Dict):
+        """Continue the numbering of the logs saved by get_state."""
+        with self._lock:
+            self.n_data = state["n_data"]
+            self.n_query = state["n_query"]
+        self.role_last_md_path = dict(state["role_last_md_path"])
 
     @staticmethod
     def replace_image_base64_with_url(messages: List[Dict[str, Union[str, List[Dict]]]],
@@ -92,8 +100,9 @@ class ChatMessageLogger:
         if file_name is None:
             sender = str(data["sender"]).split(".")[-1]
             receiver = str(data["receiver"]).split(".")[-1]
-            file_name = f"Step {self.n_data}" + " - " + sender + " - " + receiver
-            self.n_data += 1
+            with self._lock:
+                file_name = f"Step {self.n_data}" + " - " + sender + " - " + receiver
+                self.n_data += 1
 
         new_data = {}
         for k, v in data.items():
@@ -108,8 +117,9 @@ class ChatMessageLogger:
             folder.mkdir(parents=True, exist_ok=True)
 
         if file_name is None:
-            file_name = f"Query {self.n_query}"
-            self.n_query += 1
+            with self._lock:
+                file_name = f"Query {self.n_query}"
+                self.n_query += 1
             if role is not None:
                 file_name += " - " + role
                 self._role = role
@@ -10,22 +10,29 @@ from cola.role.Programmer import Programmer
 from cola.role.FileManager import FileManager
 
 from cola.workflow import Workflow
+from cola.fundamental import BaseRole
 from cola.memory.json_memory import JsonChatMessageMemory
+from cola.memory.sqlite_memory import SqliteChatMessageMemory
 from cola.memory.queue_memory import QueueMemory
 from cola.tools.vector_store.FaissVectorStore import FaissVectorStore
 from cola.tools.embedding.OpenAIEmbedding import OpenAIEmbedding
+from cola.tools.embedding.SqliteEmbeddingCache import get_default_embedding_cache
 from cola.tools.summary.OpenAISummarization import OpenAISummarization
-from cola.utils.agent_utils import agents_instance, agents_capability
+from cola.tools.lm_cache.DiskResponseCache import DiskResponseCache
+from cola.utils.agent_utils import agents_instance
 from cola.utils.print_utils import format_print_dict
 from cola.utils.datatype import RoleType, WorkflowEvent
-from cola.utils.data_utils import ContextualDataCenter, PrivateData
+from cola.utils.data_utils import PrivateData
+from cola.utils.client_utils import close_openai_clients
+from cola.utils.checkpoint_utils import CheckpointManager
+from cola.session import get_session
 
-from LMs import create_lm_model
+from LMs import create_lm_model, CachedLM
 from config.config import Config
-from typing import Dict, Optional
+from typing import Dict, Optional, List
+import argparse
 
 config = Config.get_instance()
-cdc = ContextualDataCenter()
 openai_api_key = config["openai_api_key"]
 openai_api_base = config["openai_api_base"]
 root_path = config["root_path"]
@@ -33,22 +40,36 @@ root_path = config["root_path"]
 roles = [Searcher, ApplicationManager, Programmer, FileManager]
 base_roles = [Planner, TaskScheduler, Executor, Reviewer, Interactor]
 
+lm_cache = None
+if config["lm_cache"]["enable"]:
+    lm_cache = DiskResponseCache(
+        root_path / config["lm_cache"]["cache_folder"],
+        max_entries=config["lm_cache"]["max_entries"],
+        max_size_mb=config["lm_cache"]["max_size_mb"]
+    )
+
 
-def init_role(role, role_config: Optional[Dict]):
+def init_role(role, role_config: Optional[Dict], interact_mode: Optional[str] = None,
+              session_lm_cache: Optional[DiskResponseCache] = None, session_lm_cache_mode: str = "write"):
+    session = get_session()
     if not role_config:
         if role.role == RoleType.Interactor:
-            role(agents_instance=agents_instance, agents_capability=agents_capability)
+            role(agents_instance=session.agents_instance, agents_capability=session.agents_capability)
         else:
-            role(agents_capability=agents_capability)
+            role(agents_capability=session.agents_capability)
         return
 
     lm = None
     if "lm_name" in role_config and "lm_params" in role_config:
         lm = create_lm_model(role_config["lm_name"], **role_config["lm_params"])
+        if lm_cache is not None:
+            lm = CachedLM(lm, lm_cache, mode=config["lm_cache"]["mode"])
+        if session_lm_cache is not None:
+            lm = CachedLM(lm, session_lm_cache, mode=session_lm_cache_mode)
 
     embedding = None
     if "embedding_model" in role_config and "embedding_model_params" in role_config:
-        embedding = OpenAIEmbedding(**role_config["embedding_model_params"])
+        embedding = OpenAIEmbedding(cache=get_default_embedding_cache(), **role_config["embedding_model_params"])
 
     summarizer = None
     if "summarizer_model" in role_config and role_config["enable_summarizer"] and (
@@ -57,46 +78,116 @@ def init_role(role, role_config: Optional[Dict]):
 
     ltms = None
     if embedding is not None:
-        ltms = JsonChatMessageMemory(
+        if role_config.get("memory_type", "json") == "sqlite":
+            memory_class = SqliteChatMessageMemory
+        else:
+            memory_class = JsonChatMessageMemory
+        vectorstore_params = dict(role_config.get("vectorstore_params", {}))
+        compact_threshold = vectorstore_params.pop("compact_threshold", 1000)
+        ltms = memory_class(
             embedding=embedding,
-            vectorstore=FaissVectorStore(embedding_dim=embedding.get_embedding_dim()),
+            vectorstore=FaissVectorStore(embedding_dim=embedding.get_embedding_dim(),
+                                         compact_threshold=compact_threshold, **vectorstore_params),
             summarizer=summarizer
         )
         if role_config["load_cache"]:
-            ltms.load_memory(path=root_path / role_config["cache_folder"], file_name=role_config["cache_name"])
-
-    interact_mode = config["interact_mode"] if (
-            "interact_mode" not in role_config or not role_config["interact_mode"]
-    ) else role_config["interact_mode"]
+            # The saved store is rebuilt if it was built with other index parameters
+            ltms.load_memory(path=root_path / role_config["cache_folder"], file_name=role_config["cache_name"],
+                             lazy=role_config.get("memory_lazy_load", True),
+                             warm_up=role_config.get("memory_warm_up", False),
+                             mmap=role_config.get("vectorstore_mmap", False),
+                             compact_threshold=compact_threshold, index_params=vectorstore_params)
+
+    if interact_mode is None:
+        interact_mode = config["interact_mode"] if (
+                "interact_mode" not in role_config or not role_config["interact_mode"]
+        ) else role_config["interact_mode"]
 
     role(
-        lm=lm, agents_capability=agents_capability,
-        long_term_memory_store=ltms, short_term_memory_store=QueueMemory(),
+        lm=lm, agents_capability=session.agents_capability,
+        long_term_memory_store=ltms, short_term_memory_store=QueueMemory(**config["short_term_memory"]),
         n_chat_message_history=role_config["n_chat_message_history"],
         n_short_message_history=role_config["n_short_message_history"],
+        lt_memory_score_threshold=role_config.get("lt_memory_score_threshold", None),
+        **config["context_budget"],
+        stable_prefix=config["stable_prompt_prefix"],
         interact_mode=interact_mode
     )
 
 
-if __name__ == '__main__':
-    for role in (roles + base_roles):
+def init_roles(role_classes: Optional[List] = None, interact_mode: Optional[str] = None,
+               resume: bool = False) -> Dict[str, BaseRole]:
+    """
+    Create the roles of the current session from the agent config.
+
+    Parameter:
+        role_classes: Optional[List], The roles to create, all of them by default
+        interact_mode: Optional[str], Overrides the configured interact modes of the roles
+        resume: bool, The session is resumed, the recorded LM responses of the session answer repeated requests.
+            Otherwise they are only recorded, so that a retried request gets a new completion
+    Return:
+        Dict[str, BaseRole], The created roles by name
+    """
+    session = get_session()
+    session_lm_cache = None  # LM responses of the session, replayed when the session is resumed
+    if config["checkpoint"]["enable"] and config["checkpoint"]["replay_lm_responses"]:
+        session_lm_cache = DiskResponseCache(session.config["log_folder"] / "lm_responses")
+    session_lm_cache_mode = "record" if resume else "write"
+
+    for role in (roles + base_roles if role_classes is None else role_classes):
         if role.role not in config["agent"]:
             raise ValueError(f"role: {role.role} not in config.agent")
         role_config = config["agent"][role.role]
-        init_role(role, role_config)
+        init_role(role, role_config, interact_mode, session_lm_cache, session_lm_cache_mode)
+    return session.agents_instance
+
 
-    workflow = Workflow(agents_instance)
+def create_workflow(resume: bool = False) -> Workflow:
+    session = get_session()
+    checkpoint = None
+    if config["checkpoint"]["enable"] or resume:
+        checkpoint = CheckpointManager(session.config["log_folder"], session.agents_instance,
+                                       every_n_steps=config["checkpoint"]["every_n_steps"], session=session)
+    return Workflow(session.agents_instance, checkpoint=checkpoint, session=session)
 
-    with open("task.txt", "r") as f:
-        task = f.read()
 
+def run_task(workflow: Workflow, task: str) -> str:
+    """Run a task through the workflow, return the answer, an empty string if the task failed."""
     data = PrivateData(
         sender=RoleType.Human,
         receiver=RoleType.Interactor,
         event=WorkflowEvent.Interactor_start_task,
         task=task
     )
-    data = workflow.step(data)
+    return workflow.step(data)
+
+
+def print_usage():
+    for role, instance in get_session().agents_instance.items():
+        usage = getattr(instance.brain, "usage", None)
+        if usage and usage["requests"]:
+            print("{}: {} requests, {} prompt tokens, {:.1%} cached".format(
+                role, usage["requests"], usage["prompt_tokens"], instance.brain.cached_token_ratio()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the task in task.txt.")
+    parser.add_argument("--resume", metavar="SESSION_ID", default=None,
+                        help="Resume the session from its last checkpoint instead of starting the task")
+    args = parser.parse_args()
+    if args.resume:
+        config.set_session_id(args.resume)
+        get_session().logger.set_log_folder(config["log_folder"])
+
+    init_roles(resume=bool(args.resume))
+    workflow = create_workflow(resume=bool(args.resume))
+
+    if args.resume:
+        data = workflow.resume()
+    else:
+        with open("task.txt", "r") as f:
+            task = f.read()
+        data = run_task(workflow, task)
     if isinstance(data, str):
         print("answer:", data)
 
@@ -112,3 +203,6 @@ if __name__ == '__main__':
                     file_name=config["agent"][role]["cache_name"]
                 )
                 print("memory saved for role: {}".format(role))
+
+    print_usage()
+    close_openai_clients()
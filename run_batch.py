@@ -0,0 +1,155 @@
+"""Run the tasks of a JSONL file headless, and record the latency, LM calls and success of each task.
+
+Every task runs in a fresh process with its own roles and contexts, in the non-interactive mode.
+Tasks that need the desktop (the default, or "gui": true in the record) take the desktop one at a time,
+the others only get the roles that never operate the desktop and run in parallel.
+
+A record gives the task in "task", "Question" (GAIA metadata) or "body", its id in "task_id" or "request_id",
+and optionally the expected answer in "answer" or "Final answer".
+
+Usage:
+    python run_batch.py tasks.jsonl --processes 4 --results results.jsonl
+"""
+from config.config import Config
+from cola.session import get_session
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+import multiprocessing
+import traceback
+import argparse
+import json
+import time
+import re
+
+config = Config.get_instance()
+
+TASK_FIELDS = ["task", "Question", "question", "body"]
+ID_FIELDS = ["task_id", "request_id", "id"]
+ANSWER_FIELDS = ["answer", "Final answer", "expected_answer"]
+
+_desktop_lock = None
+
+
+def _first(record: Dict, fields: List[str], default=None):
+    for field in fields:
+        if record.get(field) not in (None, ""):
+            return record[field]
+    return default
+
+
+def read_tasks(path: Path, assume_gui: bool = True, file_folder: Optional[Path] = None) -> List[Dict]:
+    """Read the tasks of a JSONL file, see the module documentation for the fields of a record."""
+    tasks = []
+    with path.open("r", encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            task = _first(record, TASK_FIELDS)
+            if task is None:
+                raise ValueError(f"Line {n + 1} of {path} has none of the task fields {TASK_FIELDS}.")
+            if record.get("file_name") and file_folder is not None:
+                task += "\nThe file of the task: {}".format((file_folder / record["file_name"]).absolute())
+            tasks.append(dict(
+                task_id=str(_first(record, ID_FIELDS, n)),
+                task=task,
+                expected=_first(record, ANSWER_FIELDS),
+                gui=bool(record.get("gui", assume_gui)),
+            ))
+    return tasks
+
+
+def normalize_answer(answer) -> str:
+    return " ".join(str(answer).strip().lower().rstrip(".").split())
+
+
+def _init_worker(desktop_lock):
+    global _desktop_lock
+    _desktop_lock = desktop_lock
+
+
+def run_one(job: Dict) -> Dict:
+    """Run a task in the current process, which must not have run another one."""
+    config["interact_mode"] = "non-interactive"
+    config.set_session_id("{}/{}".format(job["batch_id"], re.sub(r"[^\w.-]", "_", job["task_id"])))
+    get_session().logger.set_log_folder(config["log_folder"])
+    # Imported here, so that the response formats of the roles are built for the non-interactive mode
+    import main as runner
+
+    result = dict(task_id=job["task_id"], gui=job["gui"], session_id=config["session_id"])
+    start = time.perf_counter()
+    try:
+        if job["gui"]:
+            role_classes = runner.roles + runner.base_roles
+        else:
+            role_classes = [role for role in runner.roles
+                            if role.role in config["parallel_dispatch"]["roles"]] + runner.base_roles
+        agents = runner.init_roles(role_classes, interact_mode="non-interactive")
+        workflow = runner.create_workflow()
+        result["init_time"] = time.perf_counter() - start
+
+        wait_start = time.perf_counter()
+        with _desktop_lock if job["gui"] else nullcontext():
+            result["desktop_wait"] = time.perf_counter() - wait_start
+            answer = runner.run_task(workflow, job["task"])
+
+        result["answer"] = answer
+        result["accomplished"] = bool(workflow.accomplished)
+        if job["expected"] is not None:
+            result["success"] = normalize_answer(answer) == normalize_answer(job["expected"])
+        else:
+            result["success"] = result["accomplished"]
+        result["lm_calls"] = sum(getattr(agent.brain, "usage", {}).get("requests", 0) for agent in agents.values())
+        result["queries"] = sum(agent.request_times for agent in agents.values())
+    except Exception as e:
+        result["success"] = False
+        result["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+        result["traceback"] = traceback.format_exc()
+    finally:
+        result["latency"] = time.perf_counter() - start
+        runner.close_openai_clients()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", type=Path, help="JSONL file of the tasks")
+    parser.add_argument("--results", type=Path, default=None,
+                        help="JSONL file of the results, in the log folder of the batch by default")
+    parser.add_argument("--processes", type=int, default=4, help="Number of tasks running at the same time")
+    parser.add_argument("--file_folder", type=Path, default=None, help="Folder of the files attached to the tasks")
+    parser.add_argument("--assume_non_gui", action="store_true",
+                        help="Run the tasks without a gui field as tasks that do not need the desktop")
+    args = parser.parse_args()
+
+    tasks = read_tasks(args.tasks, assume_gui=not args.assume_non_gui, file_folder=args.file_folder)
+    batch_id = config["session_id"]
+    results_path = args.results or config["log_folder"] / "batch_results.jsonl"
+    for task in tasks:
+        task["batch_id"] = batch_id
+
+    # Each task gets a fresh process, so that the roles and the contexts of two tasks never mix
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    n_success = 0
+    latencies = []
+    with context.Pool(processes=args.processes, initializer=_init_worker, initargs=(context.Lock(),),
+                      maxtasksperchild=1) as pool, results_path.open("w", encoding="utf-8") as f:
+        for result in pool.imap_unordered(run_one, tasks):
+            f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            n_success += bool(result["success"])
+            latencies.append(result["latency"])
+            print("{}: {} in {:.1f}s{}".format(
+                result["task_id"], "success" if result["success"] else "failure", result["latency"],
+                ", " + result["error"] if "error" in result else ""))
+
+    elapsed = time.perf_counter() - start
+    print("{} tasks, {} succeeded, {:.1f}s in total, {:.1f}s per task on average, {:.2f} tasks per minute".format(
+        len(tasks), n_success, elapsed, sum(latencies) / max(len(latencies), 1), len(tasks) / elapsed * 60))
+    print("results:", results_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+pytest.importorskip("pywinauto")
+
+# Runs in a fresh interpreter, so that the modules are really imported and the timing includes them
+IMPORT_SCRIPT = """
+import socket
+import time
+import httpx
+import openai
+
+
+def forbidden(name):
+    def raise_error(*args, **kwargs):
+        raise AssertionError(f"{name} was called while importing cola")
+    return raise_error
+
+
+for cls in [openai.OpenAI, openai.AsyncOpenAI, httpx.Client, httpx.AsyncClient]:
+    cls.__init__ = forbidden(cls.__name__)
+socket.socket.connect = forbidden("socket.connect")
+
+start = time.perf_counter()
+import cola
+import cola.fundamental  # imported before the ops like in main.py, it imports them too
+import cola.tools.op
+import cola.utils.gaia_examples
+elapsed = time.perf_counter() - start
+
+# The embeddings and the vector stores of the ops are built on first use
+from cola.tools.op.special_operations import open_application
+assert open_application._oa is None
+assert cola.utils.gaia_examples._gaia_memory is None
+print(elapsed)
+"""
+IMPORT_TIME_LIMIT = 10  # seconds, the import of the gui libraries dominates
+
+
+def test_import_does_no_network_or_heavy_initialization():
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=Path(__file__).resolve().parents[1],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout.strip().splitlines()[-1]) < IMPORT_TIME_LIMIT
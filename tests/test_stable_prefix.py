@@ -0,0 +1,28 @@
+import json
+import pytest
+
+pytest.importorskip("pydantic")
+from cola.fundamental.base_role import BrainMechanism
+
+
+def build_request(long_term_hit: str):
+    brain = BrainMechanism()
+    brain.stable_prefix = True
+    query_messages = [
+        {"role": "user", "content": "Open the settings."},
+        {"role": "assistant", "content": "```json\n{\"branch\": \"Continue\"}\n```"},
+        {"role": "user", "content": "The settings are open, what next?"},
+    ]
+    # The long-term examples are system messages, as retrieve_long_term_memory builds them
+    episodic_messages = [{"role": "system", "content": "You are a Searcher."},
+                         {"role": "system", "content": "[Example 1]\n" + long_term_hit}]
+    linked_messages = [{"role": "system", "content": "[Article 1 Recent records]\n" + long_term_hit}]
+    return brain._assemble_request(query_messages, episodic_messages, linked_messages)
+
+
+def test_prefix_is_identical_across_long_term_hits():
+    first, second = build_request("Task: open a browser"), build_request("Task: close the mail")
+    n_prefix = 3  # the system prompt and the previous Q/R messages of the task
+    assert json.dumps(first[:n_prefix]) == json.dumps(second[:n_prefix])
+    assert first[n_prefix:] != second[n_prefix:]
+    assert first[-1] == second[-1] == {"role": "user", "content": "The settings are open, what next?"}